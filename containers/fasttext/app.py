@@ -43,6 +43,15 @@ def main():
     if not os.path.isfile(payload_filename):
         print(json.dumps({"error": f"File not found: {payload_filename}"}))
         sys.exit(1)
+    if payload_filename.endswith(".json"):
+        # a json list of texts, detected one by one with a single model load
+        with open(payload_filename, encoding='utf-8') as f:
+            texts = json.load(f)
+        model = _load_model(MODEL_PATH)
+        languages = [_detect_language(model, text) for text in texts]
+        with open(output_filename, "w", encoding='utf-8') as f:
+            f.write(json.dumps({"languages": languages}))
+        return
     with open(payload_filename, "r", encoding='utf-8') as f:
         text = f.read()
     print(f"Input text length: {len(text)}")
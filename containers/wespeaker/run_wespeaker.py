@@ -16,18 +16,15 @@ def parse_args():
     parser.add_argument("audio", help="Path to input audio file")
     parser.add_argument("output_json", help="Path to output json file")
     parser.add_argument("language", default="en", help="language code - en or anything else")
+    parser.add_argument("--model", required=True, help="pretrained model name")
     return parser.parse_args(argv)
 
 def main():
     args = parse_args()
     audio_path = args.audio
     json_path = args.output_json
-    language = args.language
 
-    if language == 'en':
-        model = wespeaker.load_model('english')
-    else:
-        model = wespeaker.load_model('vblinkf')
+    model = wespeaker.load_model(args.model)
     if torch.cuda.is_available():
         model.set_device('cuda:0')
     else:
@@ -0,0 +1,126 @@
+import dataclasses
+import gc
+import json
+import os
+import threading
+import time
+
+import torch
+import whisperx
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+app = FastAPI(title="whisperx-service", version="0.1.0")
+
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+# the last whisper model is kept between jobs, one job runs at a time
+_model = None
+_model_key = None
+_align_models = {}
+_lock = threading.Lock()
+
+
+class TranscribeRequest(BaseModel):
+    audio: str  # path inside the container, e.g. /data/audio.wav
+    output: str  # json in the format of `whisperx --output_format json`
+    model: str = "large-v2"
+    compute_type: str = "float16"
+    language: str = "en"
+    beam_size: int = 5
+    threads: int = 4
+    batch_size: int = 8
+    initial_prompt: str | None = None
+    align: bool = True  # False: whisper segment timestamps only, no word timings
+
+
+class TranscribeResponse(BaseModel):
+    output: str
+    load_seconds: float
+    transcribe_seconds: float
+    align_seconds: float
+
+
+def _with_options(options, **changes):
+    # TranscriptionOptions is a dataclass in recent faster-whisper, a namedtuple before
+    if dataclasses.is_dataclass(options):
+        return dataclasses.replace(options, **changes)
+    return options._replace(**changes)
+
+
+def _load_model(req: TranscribeRequest):
+    """
+    Beam size is set per job on the model options, other settings need another model,
+    the previous one is freed first so calibration never holds more than one.
+    """
+    global _model, _model_key
+    key = (req.model, req.compute_type, req.language, req.threads)
+    if key != _model_key:
+        _model, _model_key = None, None
+        gc.collect()
+        if DEVICE == "cuda":
+            torch.cuda.empty_cache()
+        _model = whisperx.load_model(
+            req.model,
+            DEVICE,
+            compute_type=req.compute_type,
+            language=req.language,
+            asr_options={"beam_size": req.beam_size, "temperatures": [0]},
+            vad_method="silero",
+            threads=req.threads,
+        )
+        _model_key = key
+    return _model
+
+
+def _load_align_model(language):
+    if language not in _align_models:
+        _align_models[language] = whisperx.load_align_model(language_code=language, device=DEVICE)
+    return _align_models[language]
+
+
+@app.get("/ping")
+def ping():
+    return {"status": "ok", "device": DEVICE, "model": _model_key}
+
+
+@app.post("/transcribe", response_model=TranscribeResponse)
+def transcribe(req: TranscribeRequest):
+    with _lock:
+        start = time.time()
+        model = _load_model(req)
+        if req.align:
+            align_model, metadata = _load_align_model(req.language)
+        load_seconds = time.time() - start
+
+        start = time.time()
+        model.options = _with_options(
+            model.options, initial_prompt=req.initial_prompt, beam_size=req.beam_size
+        )
+        audio = whisperx.load_audio(req.audio)
+        result = model.transcribe(audio, batch_size=req.batch_size, language=req.language)
+        transcribe_seconds = time.time() - start
+
+        start = time.time()
+        if req.align:
+            result = whisperx.align(
+                result["segments"],
+                align_model,
+                metadata,
+                audio,
+                DEVICE,
+                return_char_alignments=False,
+            )
+        result["language"] = req.language
+        align_seconds = time.time() - start
+
+    with open(req.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    # the service runs as the image user, the pipeline on the host has to read and remove it
+    os.chmod(req.output, 0o666)
+    return TranscribeResponse(
+        output=req.output,
+        load_seconds=round(load_seconds, 3),
+        transcribe_seconds=round(transcribe_seconds, 3),
+        align_seconds=round(align_seconds, 3),
+    )
@@ -0,0 +1,77 @@
+"""
+Compare whisperx transcription of one clip with and without forced alignment:
+
+    uv run python -m scripts.benchmark_alignment samples/clip.mp3 --language en --repeat 3
+
+Needs docker with the whisperx_service image. The first run of each mode warms the whisper
+and alignment models and is not counted, then the modes alternate. Prints the median
+load/transcribe/align seconds reported by the service and the wall time of the request.
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import time
+
+import src.config as config
+from src.helpers import audio_chunk_helper, hardware_profile_helper
+from src.logging_setup import setup_logging
+from src.wrappers import ffmpeg_wrapper, whisperx_wrapper
+
+FIELDS = ["load_seconds", "transcribe_seconds", "align_seconds", "wall_seconds"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="whisperx with vs without forced alignment")
+    parser.add_argument("input", help="audio or video file")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--repeat", type=int, default=3, help="counted runs per mode")
+    parser.add_argument("--config", default="config.yaml")
+    return parser.parse_args()
+
+
+def run_once(audio, language, align):
+    threads = hardware_profile_helper.get_profile().whisper_threads
+    start = time.time()
+    _output_json, timings = whisperx_wrapper._run_whisperx_service(
+        audio, language, None, threads, align=align
+    )
+    return {**timings, "wall_seconds": time.time() - start}
+
+
+def main():
+    args = parse_args()
+    setup_logging(False)
+    config.init_config(config_path=args.config, cli_args={"whisper_service": True})
+    os.makedirs("data", exist_ok=True)
+    input_path = os.path.join("data", os.path.basename(args.input))
+    if os.path.abspath(input_path) != os.path.abspath(args.input):
+        shutil.copy2(args.input, input_path)
+    audio = ffmpeg_wrapper.normalize_audio(input_path)
+    duration = audio_chunk_helper.wav_duration(audio)
+
+    results = {True: [], False: []}
+    with whisperx_wrapper.WhisperService() as service:
+        if service.base_url() is None:
+            raise SystemExit("whisperx_service did not start")
+        for align in results:
+            run_once(audio, args.language, align)
+        for _ in range(args.repeat):
+            for align in results:
+                results[align].append(run_once(audio, args.language, align))
+
+    print(f"clip: {round(duration)}s, {args.repeat} runs per mode, medians")
+    print(f"{'mode':<10}" + "".join(f"{field:>20}" for field in FIELDS))
+    for align, runs in results.items():
+        medians = [statistics.median(run[field] for run in runs) for field in FIELDS]
+        mode = "aligned" if align else "unaligned"
+        print(f"{mode:<10}" + "".join(f"{median:>20.2f}" for median in medians))
+    aligned, unaligned = (
+        statistics.median(run["wall_seconds"] for run in results[align]) for align in results
+    )
+    print(f"alignment adds {aligned - unaligned:.2f}s ({aligned / unaligned - 1:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,10 +26,21 @@ def parse_args():
         help="stage of pipeline, you would like to start from (default: first stage)",
     )
     parser.add_argument(
-        "--translate-to", help="Translate to English (en) or Russian (ru), default: no translation"
+        "--translate-to",
+        help="Translate to English (en), Russian (ru) or several languages at once (ru,de,cs), "
+        "one output per language, default: no translation",
     )
     parser.add_argument("--output-format", help="epub | mobi | txt")
-    parser.add_argument("--ollama-url", help="Ollama API URL, e.g --ollama-url http://localhost:11434")
+    parser.add_argument(
+        "--ollama-url",
+        help="Ollama API URL or comma separated list of URLs to balance requests across, "
+        "e.g --ollama-url http://localhost:11434,http://gpu-box:11434",
+    )
+    parser.add_argument(
+        "--llm-backend",
+        help="ollama | openai (OpenAI-compatible server such as llama.cpp or vLLM), "
+        "default: ollama",
+    )
     parser.add_argument(
         "--diarize", action="store_true", help="Enable diarization (default: disabled)"
     )
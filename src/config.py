@@ -1,21 +1,61 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from omegaconf import OmegaConf
 
 
+@dataclass
+class OllamaEndpointConfig:
+    url: str = ""
+    weight: float = 1.0
+    models: list[str] = field(default_factory=list)  # empty list: serves any model
+    max_concurrency: int = 2
+
+
 @dataclass
 class AppConfig:
     output_format: str = "epub"
     start_from: str | None = None
-    translate_to: str | None = None  # e.g. 'en'
+    translate_to: str | None = None  # e.g. 'en', or 'ru,de,cs' for one output per language
     models_dir: str | None = os.path.join(os.getcwd(), "models")
     ollama_models_dir: str | None = os.path.join(os.getcwd(), "models", "ollama_models")
     use_whisper_prompt: bool = False
     diarize: bool = False
     simplify_transcript: bool = False
     fix_grammar: bool = False
-    ollama_url: str | None = None
+    ollama_url: str | None = None  # single url or comma separated list of urls
+    ollama_endpoints: list[OllamaEndpointConfig] = field(default_factory=list)
+    # ollama | openai (llama.cpp server, vLLM and other OpenAI-compatible servers)
+    llm_backend: str = "ollama"
+    llm_api_key: str | None = None
+    # model name -> name on the server
+    llm_model_aliases: dict[str, str] = field(default_factory=dict)
+    # hardware, detected at start-up when not set
+    ram_gb: float | None = None
+    vram_gb: float | None = None
+    cpu_cores: int | None = None
+    # models, chosen by the hardware profile when not set
+    llm_model: str | None = None  # e.g. 'ministral-3:8b'
+    translate_model: str | None = None  # e.g. 'hy-mt1.5-7b:q8'
+    whisper_model: str | None = None  # e.g. 'large-v2'
+    whisper_compute_type: str | None = None  # e.g. 'int8'
+    # parallel whisper processes over audio chunks, 1: no chunking
+    whisper_workers: int | None = None
+    transcript_cache: bool = True  # reuse transcripts and diarizations of identical audio
+    transcript_cache_mb: int = 512  # least recently used entries are removed above it, 0: no limit
+    # keep the whisper model loaded in one container between the chunks of a transcription
+    whisper_service: bool = True
+    # calibrate whisper settings on a clip of the first file, stored per machine in data/
+    whisper_autotune: bool = False
+    whisper_target_rtf: float = 0.3  # transcription seconds per second of audio
+    whisper_max_wer_increase: float = 0.03  # word error rate allowed against the default settings
+    # LanguageTool rule id or issue type -> auto | llm | ignore, see grammar_policy_helper
+    grammar_rule_policy: dict[str, str] = field(default_factory=dict)
+    # rules whose first replacement the LLM chose this many times in a row become auto, 0: never
+    grammar_auto_promote_after: int = 20
+    # translate paragraphs of finished transcript chunks while later chunks are transcribed
+    stream_transcript: bool = False
+    translation_memory: bool = True  # reuse translations stored in data/translation_memory.sqlite
 
 
 CONFIG: AppConfig | None = None
@@ -38,6 +78,13 @@ def init_config(*, config_path: str | None = None, cli_args: dict | None = None)
     return cfg
 
 
+def get_translate_targets() -> list[str]:
+    cfg = get_config()
+    if not cfg or not cfg.translate_to:
+        return []
+    return [language.strip() for language in cfg.translate_to.split(",") if language.strip()]
+
+
 def get_config() -> AppConfig:
     if CONFIG is None:
         init_config(config_path="config.yaml")
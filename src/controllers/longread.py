@@ -4,7 +4,7 @@ from urllib.parse import urlparse
 
 from bs4 import BeautifulSoup
 
-from src.config import get_config
+from src.config import get_config, get_translate_targets
 from src.controllers import pdf
 from src.helpers import text_helper
 from src.helpers.filepath_helper import generate_random_filename, get_abs_path, get_rel_path
@@ -21,10 +21,11 @@ from src.loaders import longread_loader
 from src.pipeline import (
     PipelineResource,
     PipelineStage,
+    collect_outputs,
     copy_arguments,
-    fold_pipeline,
+    fold_pipeline_per_target,
     get_last_pipeline_state,
-    restart_stage,
+    restart_stage_per_target,
     run_with_resources,
 )
 from src.wrappers import calibre_wrapper, ollama_wrapper, pillow_wrapper, readability_wrapper
@@ -43,6 +44,7 @@ class Longread:
     cleaned_filename: str | None = None
     latex_filename: str | None = None
     processed_filename: str | None = None
+    translate_to: str | None = None  # target language of this copy of the job
     translated_html_filename: str | None = None
     text_filename: str | None = None
     cover_url: str | None = None
@@ -54,7 +56,7 @@ class Longread:
 
 def _ollama_factory():
     cfg = get_config()
-    if cfg and cfg.ollama_url:
+    if cfg and (cfg.ollama_url or cfg.ollama_endpoints):
         return NoManagedService()
     return ManagedDockerService("ollama")
 
@@ -145,7 +147,7 @@ def get_pipeline():
         PipelineStage(localize_images, ["latex_filename", "link"], ["processed_filename"]),
         PipelineStage(
             translate_html_file,
-            ["processed_filename"],
+            ["processed_filename", "translate_to"],
             ["translated_html_filename"],
             enabled=(get_config().translate_to is not None),
             resources=[OLLAMA_RES],
@@ -174,10 +176,15 @@ def get_pipeline():
 def link2mobi(url, file_path=None):
     pipeline_state = get_last_pipeline_state(Longread, {"url": url, "file_path": file_path})
     if get_config().start_from and pipeline_state:
-        longread, _ = restart_stage(
-            get_config().start_from, get_pipeline(), pipeline_state, Longread
+        results = restart_stage_per_target(
+            get_config().start_from,
+            get_pipeline(),
+            pipeline_state,
+            Longread,
+            "translate_html_file",
+            get_translate_targets(),
         )
-        return longread.mobi_file_path
+        return collect_outputs([longread for longread, _log in results], "mobi_file_path")
     else:
         link, html_filename = run_with_resources(
             prepare_input, [OLLAMA_RES, READABILITY_RES], [url, file_path]
@@ -185,8 +192,10 @@ def link2mobi(url, file_path=None):
         if longread_loader.is_pdf_file(html_filename):
             return pdf.pdf_to_mobi(html_filename)
         longread = Longread(url=url, file_path=file_path, link=link, html_filename=html_filename)
-        longread, _ = fold_pipeline(get_pipeline(), longread)
-        return longread.mobi_file_path
+        results = fold_pipeline_per_target(
+            get_pipeline(), longread, "translate_html_file", get_translate_targets()
+        )
+        return collect_outputs([longread for longread, _log in results], "mobi_file_path")
 
 
 def replace_longread_url(url):
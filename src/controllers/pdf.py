@@ -6,16 +6,17 @@ from tqdm import tqdm
 
 import src.helpers.latex_helper
 from src.helpers.html_helper import html_to_text
-from src.config import get_config
+from src.config import get_config, get_translate_targets
 from src.helpers import html_helper, latex_helper, text_helper
 from src.helpers.filepath_helper import generate_random_filename, get_abs_path, get_rel_path
 from src.pipeline import (
     PipelineResource,
     PipelineStage,
+    collect_outputs,
     copy_arguments,
-    fold_pipeline,
+    fold_pipeline_per_target,
     get_last_pipeline_state,
-    restart_stage,
+    restart_stage_per_target,
 )
 from src.wrappers import (
     calibre_wrapper,
@@ -34,7 +35,7 @@ logger = logging.getLogger(__name__)
 # Resource dependency definitions
 def _ollama_factory():
     cfg = get_config()
-    if cfg and cfg.ollama_url:
+    if cfg and (cfg.ollama_url or cfg.ollama_endpoints):
         return NoManagedService()
     return ManagedDockerService("ollama")
 
@@ -86,6 +87,7 @@ class PDFDocument:
     md_filename_correct: str = None
     html_filename: str = None
     new_html_filename: str = None
+    translate_to: str = None  # target language of this copy of the job
     translated_html_filename: str = None
     text_filename: str = None
     cover_image: str = None
@@ -221,7 +223,7 @@ def get_pipeline():
         PipelineStage(convert_html_with_mathml_to_html, ["html_filename"], ["new_html_filename"]),
         PipelineStage(
             html_helper.translate_html_file,
-            ["new_html_filename"],
+            ["new_html_filename", "translate_to"],
             ["translated_html_filename"],
             enabled=(get_config().translate_to is not None),
             resources=[OLLAMA_RES],
@@ -403,9 +405,11 @@ def recover_broken_blocks(blocks):
             (block.char_per_token > 2.0 or block.tokens < 5)
             and block.tokens < 500
             and "<td>None</td>" not in block.text
+            and not text_helper.is_degenerate(block.text)
         ):
             # each normal block is under 500 tokens
             # sometimes deepseek-ocr repeat the same sequence until reached context window limit
+            # (ollama_wrapper stops such a page early, the looping block is re-OCRed here)
             # sometimes deepseek-ocr provide table instead of normal text
             result.append(block)
         else:
@@ -554,22 +558,28 @@ def blocks_to_md_file(blocks, title):
 
 
 def process_pdf_document(pdf_document):
-    """Process a PDF document using the pipeline."""
+    """Process a PDF document using the pipeline, one document per translation target."""
     pipeline = get_pipeline()
-    # Add cover image parameter for convert_to_mobi
-    pdf_document, _log = fold_pipeline(pipeline, pdf_document)
-    return pdf_document
+    results = fold_pipeline_per_target(
+        pipeline, pdf_document, "translate_html_file", get_translate_targets()
+    )
+    return [pdf_document for pdf_document, _log in results]
 
 
 def pdf_to_mobi(file_name):
     """Main function to convert PDF to MOBI using the pipeline approach."""
     last_saved_pipeline_state = get_last_pipeline_state(PDFDocument, {"file_name": file_name})
     if last_saved_pipeline_state and get_config().start_from:
-        pdf_document, _ = restart_stage(
-            get_config().start_from, get_pipeline(), last_saved_pipeline_state, PDFDocument
+        results = restart_stage_per_target(
+            get_config().start_from,
+            get_pipeline(),
+            last_saved_pipeline_state,
+            PDFDocument,
+            "translate_html_file",
+            get_translate_targets(),
         )
-        return pdf_document.mobi_file_path
+        return collect_outputs([pdf_document for pdf_document, _log in results], "mobi_file_path")
     else:
         pdf_document = PDFDocument(file_name=file_name)
-        pdf_document = process_pdf_document(pdf_document)
-        return pdf_document.mobi_file_path
+        pdf_documents = process_pdf_document(pdf_document)
+        return collect_outputs(pdf_documents, "mobi_file_path")
@@ -1,28 +1,33 @@
+import bisect
 import json
 import logging
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-
-from tqdm import tqdm
+from functools import partial
 
 import src.helpers.html_helper as html_helper
 from src.helpers.html_helper import html_to_text
 import src.helpers.text_helper as text_helper
 import src.wrappers.ollama_wrapper as ollama_wrapper
 import src.wrappers.whisperx_wrapper
-from src.config import get_config
+from src.config import get_config, get_translate_targets
 from src.helpers.filepath_helper import generate_random_filename, get_abs_path, get_rel_path
-from src.helpers.grammar_helper import fix_grammar_with_llm
+from src.helpers.grammar_helper import fix_grammar_in_paragraphs
 from src.loaders import media_loader
 from src.models.video_models import Chapter
 from src.pipeline import (
     PipelineResource,
     PipelineStage,
+    bind_context,
+    collect_outputs,
     copy_arguments,
-    fold_pipeline,
+    fold_pipeline_per_target,
     get_last_pipeline_state,
-    restart_stage,
+    needs_word_timings,
+    record_trace,
+    restart_stage_per_target,
 )
 from src.wrappers import (
     calibre_wrapper,
@@ -35,9 +40,11 @@ from src.wrappers import (
 )
 from src.wrappers.docker_wrapper import ManagedDockerService, NoManagedService
 from src.wrappers.ffmpeg_wrapper import (
-    _probe_audio_codec,
-    _probe_duration_seconds,
-    _run_in_ffmpeg_container,
+    ASR_AUDIO_ARGS,
+    extract_audio_and_frames,
+    load_frame_timestamps,
+    normalize_audio,
+    probe_media,
 )
 from src.wrappers.ollama_wrapper import generate_title
 from src.wrappers.cosyvoice_wrapper import tts
@@ -47,7 +54,7 @@ logger = logging.getLogger(__name__)
 # Resource definitions for PipelineStage
 def _ollama_factory():
     cfg = get_config()
-    if cfg and cfg.ollama_url:
+    if cfg and (cfg.ollama_url or cfg.ollama_endpoints):
         return NoManagedService()
     return ManagedDockerService("ollama")
 
@@ -62,6 +69,11 @@ OLLAMA_RES = PipelineResource(
     setup=_ollama_setup,
 )
 
+WHISPER_RES = PipelineResource(
+    factory=src.wrappers.whisperx_wrapper.WhisperService,
+    setup=lambda service: None,
+)
+
 LT_RES = PipelineResource(
     factory=lambda: ManagedDockerService("languagetool"),
     setup=lambda service: language_tool_wrapper.set_language_tool_port(service.port),
@@ -84,11 +96,11 @@ class Video:
     duration_in_seconds: int | None = None
     selected_images: list | None = None
     images_with_seconds: list | None = None
-    text_from_selected_images: str | None = None
     whisper_prompt: str | None = None
     dlp_language: str | None = None
     language: str | None = None
     audio_filename: str | None = None
+    normalized_audio_filename: str | None = None  # 16 kHz mono wav for asr and diarization
     json_transcript_filename: str | None = None
     json_diarization_filename: str | None = None
     sentence_segments: list | None = None
@@ -102,6 +114,7 @@ class Video:
     model: list | None = None  # [h1, h2, p, img]
     joined_model: list | None = None
     processed_model: list | None = None  # [h1, h2, p, img] fixed errors, rejoin p
+    translate_to: str | None = None  # target language of this copy of the job
     translated_model: list | None = None
     cover_filename: str | None = None
     html_filename: str | None = None
@@ -130,8 +143,8 @@ def handle_audio_file(audio_filename, title, author, cover):
     video.images_with_seconds = []
     if cover:
         video.cover_filename = get_rel_path(cover)
-    video = process_video_object(video)
-    return video.mobi_filename
+    videos = process_video_object(video)
+    return collect_outputs(videos, "mobi_filename")
 
 def handle_video_file(video_filename, title, author):
     video = Video(
@@ -141,8 +154,8 @@ def handle_video_file(video_filename, title, author):
         author=author,
         language="ru"
     )
-    video = process_video_object(video)
-    return video.mobi_filename
+    videos = process_video_object(video)
+    return collect_outputs(videos, "mobi_filename")
 
 def handle_youtube_playlist_link(playlist_url):
     # Create a temporary directory for playlist info
@@ -170,24 +183,34 @@ def handle_youtube_playlist_link(playlist_url):
     # Sort videos by upload date
     videos_info.sort(key=lambda x: x.get("upload_date", "00000000"))
 
-    # Process each video
-    videos = []
+    # Process each video, one processed copy of it per translation target
+    videos_by_target = {target: [] for target in get_translate_targets() or [None]}
     for video_info in videos_info:
         video_url = f"https://www.youtube.com/watch?v={video_info['id']}"
         video_url = video_info["url"] if "url" in video_info else video_url
-        video = process_video_object(Video(video_url))
-        videos.append(video)
+        for video in process_video_object(Video(video_url)):
+            videos_by_target[video.translate_to].append(video)
 
+    mobi_files = [
+        _playlist_to_mobi(videos, playlist_title, playlist_author, translate_to)
+        for translate_to, videos in videos_by_target.items()
+    ]
+    return mobi_files[0] if len(mobi_files) == 1 else mobi_files
+
+
+def _playlist_to_mobi(videos, playlist_title, playlist_author, translate_to):
     # Combine all videos into one model
     model = []
     cover_filename = None
     for video in videos:
-        model += video.processed_model
+        model += video.translated_model or video.processed_model
         if cover_filename is None:
             cover_filename = video.cover_filename
 
     html_file = model_to_html(model, playlist_title)
     output_filename = text_helper.clean_title(playlist_title) + ".mobi"
+    if translate_to and len(get_translate_targets()) > 1:
+        output_filename = text_helper.clean_title(playlist_title) + "_" + translate_to + ".mobi"
     try:
         prepared_cover = pillow_wrapper.create_cover(
             cover_filename or "/dev/null", playlist_title, playlist_author, cwd="data"
@@ -210,23 +233,24 @@ def handle_youtube_playlist_link(playlist_url):
 def handle_youtube_video_link(video_url):
     last_saved_pipeline_state = get_last_pipeline_state(Video, {"video_url": video_url})
     if last_saved_pipeline_state and get_config().start_from:
-        video, _new_pipeline_state = restart_stage(
-            get_config().start_from, get_pipeline(), last_saved_pipeline_state, Video
+        results = restart_stage_per_target(
+            get_config().start_from,
+            get_pipeline(),
+            last_saved_pipeline_state,
+            Video,
+            "translate_model",
+            get_translate_targets(),
         )
-        return video.mobi_filename
+        return collect_outputs([video for video, _log in results], "mobi_filename")
     else:
         video = Video(video_url)
-        video = process_video_object(video)
-        return video.mobi_filename
-
-
-def extract_speakers_names(a, b, c, d):
-    return ollama_wrapper.extract_speakers_names(a, b, c, d)
+        videos = process_video_object(video)
+        return collect_outputs(videos, "mobi_filename")
 
 
 def get_pipeline():
     cfg = get_config()
-    return [
+    pipeline = [
         PipelineStage(
             media_loader.load_media,
             ["video_url"],
@@ -257,49 +281,44 @@ def get_pipeline():
         ),
         PipelineStage(
             add_seconds_to_images,
-            ["selected_images", "images_count", "duration_in_seconds"],
+            ["selected_images", "images_count", "duration_in_seconds", "images_dir"],
             ["images_with_seconds"],
         ),
         # Whisper Prompt Generation (Conditional)
-        PipelineStage(
-            extract_text_from_images,
-            ["images_dir", "selected_images"],
-            ["text_from_selected_images"],
-            enabled=cfg.use_whisper_prompt,
-            resources=[OLLAMA_RES],
-        ),
-        PipelineStage(
-            extract_speakers_names,
-            ["text_from_selected_images", "title", "author", "description"],
-            ["speakers"],
-            enabled=cfg.use_whisper_prompt,
-            resources=[OLLAMA_RES],
-        ),
-        PipelineStage(
-            deduplicate_speakers,
-            ["speakers", "language"],
-            ["unique_speakers"],
-            enabled=cfg.use_whisper_prompt,
-        ),
         PipelineStage(
             generate_whisper_prompt,
-            ["title", "description", "unique_speakers", "text_from_selected_images", "language"],
-            ["whisper_prompt"],
+            ["images_dir", "selected_images", "title", "author", "description", "language"],
+            ["speakers", "unique_speakers", "whisper_prompt"],
             enabled=cfg.use_whisper_prompt,
             resources=[OLLAMA_RES],
         ),
         # Transcription & Diarization
+        PipelineStage(
+            normalize_audio, ["audio_filename"], ["normalized_audio_filename"], critical=True
+        ),
         PipelineStage(
             wespeaker_wrapper.diarize,
-            ["audio_filename", "language"],
+            ["normalized_audio_filename", "language"],
             ["json_diarization_filename"],
             enabled=cfg.diarize,
+            # speakers are matched by overlap, aligned segment boundaries make it accurate
+            needs_word_timings=True,
         ),
         PipelineStage(
-            src.wrappers.whisperx_wrapper.audio_to_json,
-            ["audio_filename", "language", "whisper_prompt"],
+            transcribe,
+            [
+                "normalized_audio_filename",
+                "language",
+                "whisper_prompt",
+                "images_with_seconds",
+                "chapters",
+                "duration_in_seconds",
+            ],
             ["json_transcript_filename"],
             critical=True,
+            resources=[WHISPER_RES]
+            + ([OLLAMA_RES] if _wants_pretranslation() and not _pretranslation_blocker() else []),
+            _given_name="audio_to_json",
         ),
         PipelineStage(
             join_transcription_and_diarization,
@@ -379,7 +398,7 @@ def get_pipeline():
             _given_name="process_model",
         ),
         PipelineStage(translate_model,
-                      ["processed_model", "language"],
+                      ["processed_model", "language", "translate_to"],
                       ["translated_model"],
                       resources=[OLLAMA_RES],
                       enabled=get_config().translate_to is not None),
@@ -395,7 +414,7 @@ def get_pipeline():
             select_cover, ["images_dir", "selected_images", "video_url"], ["cover_filename"]
         ),
         PipelineStage(model_to_html, ["translated_model", "title"], ["html_filename"]),
-        PipelineStage(create_output_filename, ["title"], ["output_filename"]),
+        PipelineStage(create_output_filename, ["title", "translate_to"], ["output_filename"]),
         PipelineStage(
             pillow_wrapper.create_cover,
             ["cover_filename", "title", "author", "cwd"],
@@ -419,12 +438,19 @@ def get_pipeline():
         PipelineStage(tts, ["text_filename"], ["mobi_filename"],
                       enabled=get_config().output_format in ["mp3", "acc", "ogg", "wav"]),
     ]
+    # forced alignment loads a wav2vec2 model per language, skip it when nothing uses it
+    transcribe_stage = next(stage for stage in pipeline if stage.name == "audio_to_json")
+    transcribe_stage.func = partial(transcribe, align=needs_word_timings(pipeline))
+    return pipeline
 
 
 def process_video_object(video):
+    """Process a video, returns one Video per translation target (one without translation)."""
     pipeline = get_pipeline()
-    video, _log = fold_pipeline(pipeline, video)
-    return video
+    results = fold_pipeline_per_target(
+        pipeline, video, "translate_model", get_translate_targets()
+    )
+    return [video for video, _log in results]
 
 
 def guess_language(text1, text2, text3, dlp_language):
@@ -446,60 +472,178 @@ def guess_language(text1, text2, text3, dlp_language):
     return detected_language
 
 
-def extract_text_from_images(images_dir, images):
-    text = ""
-    for image in images:
-        filename = images_dir + "/" + image
-        image_text = ollama_wrapper.extract_text_from_screenshot(filename)
-        if image_text:
-            text += " " + image_text
-        logger.debug("%s %s", image, image_text)
-    return text
-
-
 def deduplicate_speakers(speakers, language):
+    """Drop single-word names whose base form is part of another name (Маши -> Мария Иванова)."""
     speakers = list(set(speakers))
+    single_word = [speaker for speaker in speakers if " " not in speaker.strip()]
+    if not single_word:
+        return speakers
+    # all names are lemmatised in one container run
+    base_names_list = pymorphy3_wrapper.extract_base_names_bulk(language, *single_word)
+    single_word_base_names = dict(zip(single_word, base_names_list, strict=True))
     final_speakers = []
-    for i, speaker in enumerate(speakers):
-        if " " not in speaker.strip():
-            base_names = pymorphy3_wrapper.extract_base_names(speaker, language)
-            include_speaker = True
-            for base_name in base_names:
-                for name in speakers:
-                    if name != speaker:
-                        if base_name in name:
-                            include_speaker = False
-            if include_speaker:
-                final_speakers.append(speaker)
-        else:
+    for speaker in speakers:
+        include_speaker = True
+        for base_name in single_word_base_names.get(speaker, []):
+            for name in speakers:
+                if name != speaker and base_name in name:
+                    include_speaker = False
+        if include_speaker:
             final_speakers.append(speaker)
     return final_speakers
 
 
-def generate_whisper_prompt(title, description, speakers, text_from_images, language):
-    terms = []
+def generate_whisper_prompt(images_dir, images, title, author, description, language):
+    image_paths = ["data/" + images_dir + "/" + image for image in images or []]
     try:
-        terms = ollama_wrapper.extract_terms(text_from_images, description, title)
-        terms = ollama_wrapper.filter_terms(terms)
-    except Exception:
-        terms = []
-    if not terms:
-        terms = []
-    if not speakers:
-        speakers = []
+        speakers, terms = ollama_wrapper.extract_names_and_terms(
+            image_paths, title, author, description
+        )
+    except Exception as e:
+        logger.debug("extract_names_and_terms failed: %s", e)
+        speakers, terms = [], []
+    speakers = [speaker.strip() for speaker in speakers if speaker.strip()]
+    unique_speakers = deduplicate_speakers(speakers, language) if speakers else []
     stop_list = ["facebook", "fb", "instagram", "youtube", "tiktok"]
     terms = list(
         filter(lambda x: x.strip() != "" and x.lower() not in stop_list and len(x) < 24, terms)
     )
     terms = terms[:10]
-    words = terms + speakers
+    words = terms + unique_speakers
     logger.debug(f"terms: {terms}")
-    logger.debug(f"speakers: {speakers}")
+    logger.debug(f"speakers: {unique_speakers}")
     logger.debug(f"words: {words}")
     if len(words) < 3:
-        return None
+        whisper_prompt = None
     else:
-        return ", ".join(words) + "."
+        whisper_prompt = ", ".join(words) + "."
+    return speakers, unique_speakers, whisper_prompt
+
+
+def _pretranslation_blocker():
+    """Why paragraphs of the finished book can not be predicted from raw segments, or None."""
+    cfg = get_config()
+    if not cfg.translation_memory:
+        return "translation_memory is off, translate_model would not find the translations"
+    if cfg.diarize:
+        return "diarize: speaker names are matched after transcription and split paragraphs"
+    if cfg.simplify_transcript:
+        return "simplify_transcript rewrites the sentences"
+    if cfg.fix_grammar:
+        return "fix_grammar rewrites the paragraphs"
+    return None
+
+
+def _wants_pretranslation():
+    return bool(get_config().stream_transcript and get_translate_targets())
+
+
+def predicted_chapters(chapters, images_with_seconds, duration_in_seconds):
+    """
+    Chapters as generate_final_chapters will place them (titles left empty), None when their
+    boundaries depend on the transcript. Generated chapters of empty buckets are dropped later,
+    that moves no paragraph break: the next chapter starts before the same sentence.
+    """
+    if chapters:
+        return chapters
+    if _chapters_need_transcript(images_with_seconds, duration_in_seconds):
+        return None
+    seconds_list = chapter_seconds_list(images_with_seconds, duration_in_seconds)
+    return [
+        Chapter("", start, end - start)
+        for start, end in zip(seconds_list[:-1], seconds_list[1:], strict=True)
+    ]
+
+
+class ParagraphPretranslator:
+    """
+    Builds the model from transcript segments arriving chunk by chunk with the same
+    create_initial_model and join_paragraphs the book is built with, and translates every
+    closed paragraph in the background. Translations land in the translation memory,
+    so translate_model later finds them there instead of translating after the whole
+    transcription. Only the last paragraph can still grow, the earlier ones are final.
+    """
+
+    def __init__(self, language, targets, images_with_seconds, chapters):
+        self.language = language
+        self.targets = targets
+        self.images_with_seconds = images_with_seconds
+        self.chapters = chapters
+        self.segments = []
+        self.submitted = set()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def _paragraphs(self):
+        sentences = assign_speakers(self.segments, NO_DIARIZATION)
+        # image paths do not change paragraph breaks
+        model = join_paragraphs(
+            create_initial_model(None, self.chapters, sentences, self.images_with_seconds, "")
+        )
+        return [(item[1], context) for item, context in translation_requests(model)
+                if item[0] == "p"]
+
+    def _submit(self, paragraphs):
+        paragraphs = [(text, context) for text, context in paragraphs
+                      if text not in self.submitted]
+        if not paragraphs:
+            return
+        texts = [text for text, _context in paragraphs]
+        contexts = [context for _text, context in paragraphs]
+        for target in self.targets:
+            translate_many = bind_context(ollama_wrapper.translate_many)
+            self.executor.submit(translate_many, texts, self.language, target, contexts)
+        self.submitted.update(texts)
+
+    def add_segments(self, segments):
+        self.segments += segments
+        self._submit(self._paragraphs()[:-1])
+
+    def close(self):
+        self._submit(self._paragraphs())
+        self.executor.shutdown(wait=True)
+        record_trace("streaming_pretranslation", {"paragraphs": len(self.submitted)})
+
+
+def transcribe(
+    audio_filename,
+    language,
+    whisper_prompt,
+    images_with_seconds,
+    chapters,
+    duration_in_seconds,
+    align=True,
+):
+    record_trace("whisper_alignment", {"align": align})
+    pretranslator = None
+    if _wants_pretranslation():
+        final_chapters = predicted_chapters(chapters, images_with_seconds, duration_in_seconds)
+        blocker = _pretranslation_blocker()
+        if blocker is None and final_chapters is None:
+            blocker = "chapter boundaries depend on the transcript length"
+        if blocker:
+            logger.warning("stream_transcript: no pre-translation, %s", blocker)
+            record_trace("streaming_pretranslation", {"disabled": blocker})
+        else:
+            pretranslator = ParagraphPretranslator(
+                language, get_translate_targets(), images_with_seconds or [], final_chapters
+            )
+    if pretranslator is None:
+        return src.wrappers.whisperx_wrapper.audio_to_json(
+            audio_filename, language, whisper_prompt, align=align
+        )
+    try:
+        return src.wrappers.whisperx_wrapper.audio_to_json(
+            audio_filename,
+            language,
+            whisper_prompt,
+            on_segments=pretranslator.add_segments,
+            align=align,
+        )
+    finally:
+        pretranslator.close()
+
+
+NO_DIARIZATION = [{"start": 0.0, "end": 9999, "speaker": 0}]
 
 
 def join_transcription_and_diarization(transcript_filename, diarization_filename):
@@ -511,10 +655,14 @@ def join_transcription_and_diarization(transcript_filename, diarization_filename
         # "diarization_segments": [{"start": 0.6, "end": 2.9, "speaker": 0},
         diarization_segments = diarization["diarization_segments"]
     except Exception:
-        diarization_segments = [{"start": 0.0, "end": 9999, "speaker": 0}]
+        diarization_segments = NO_DIARIZATION
+    return assign_speakers(transcript["segments"], diarization_segments)
+
 
+def assign_speakers(segments, diarization_segments):
+    """Sentence segments with the speaker of the most overlapping diarization segment."""
     sentence_segments = []
-    for segment in transcript["segments"]:
+    for segment in segments:
         start = segment["start"]
         end = segment["end"]
         text = segment["text"]
@@ -631,19 +779,16 @@ def match_speakers(sentences, title, description, author, window_size=20, model_
     return sentences
 
 
-def generate_final_chapters(
-    chapters, sentence_segments, images_with_seconds, language, duration_in_seconds, title
-):
-    if chapters:
-        return chapters
-    sentences = sentence_segments  # {"sentence": "телегу", "start": 1549.059, "end": 1549.419}
-    seconds_list = [0] + [pair[0] for pair in images_with_seconds] + [duration_in_seconds]
+def _chapters_need_transcript(images_with_seconds, duration_in_seconds):
+    # without a known duration evenly split chapters end at the last sentence
+    return len(images_with_seconds or []) <= 2 and duration_in_seconds < 2
+
+
+def chapter_seconds_list(images_with_seconds, duration_in_seconds):
+    """Chapter boundaries: at the images when there are more than two, else even splits."""
+    seconds_list = [0] + [pair[0] for pair in images_with_seconds or []] + [duration_in_seconds]
     if len(seconds_list) <= 4:
         chapter_count = 10
-        if duration_in_seconds < 2:
-            for sentence in sentences:
-                if sentence["start"] > duration_in_seconds:
-                    duration_in_seconds = sentence["start"]
         if duration_in_seconds < 1800:
             chapter_count = 5
         seconds_list = (
@@ -651,19 +796,79 @@ def generate_final_chapters(
             + [(i * duration_in_seconds) // chapter_count for i in range(1, chapter_count)]
             + [duration_in_seconds]
         )
+    return seconds_list
+
+
+def generate_final_chapters(
+    chapters, sentence_segments, images_with_seconds, language, duration_in_seconds, title
+):
+    if chapters:
+        return chapters
+    sentences = sentence_segments  # {"sentence": "телегу", "start": 1549.059, "end": 1549.419}
+    if _chapters_need_transcript(images_with_seconds, duration_in_seconds):
+        for sentence in sentences:
+            if sentence["start"] > duration_in_seconds:
+                duration_in_seconds = sentence["start"]
+    seconds_list = chapter_seconds_list(images_with_seconds, duration_in_seconds)
     seconds_pairs = list(zip(seconds_list[:-1], seconds_list[1:], strict=False))
-    final_chapters = []
-    sentence_index = 0
-    for i, (start, end) in enumerate(seconds_pairs):
-        if sentence_index >= len(sentences):
-            break
-        chapter_sentences = [sentence for sentence in sentences if start <= sentence["start"] < end]
-        if len(chapter_sentences) == 0:
-            continue
-        chapter_text = " ".join([sentence["sentence"] for sentence in chapter_sentences])
-        chapter_title = generate_title(chapter_text, title, language)
-        final_chapters.append(Chapter(chapter_title, start, end - start))
-    return final_chapters
+    buckets = bucket_sentences_by_time(sentences, seconds_pairs)
+    non_empty = [
+        (start, end, bucket)
+        for (start, end), bucket in zip(seconds_pairs, buckets, strict=True)
+        if bucket
+    ]
+
+    def title_for_chapter(item):
+        _start, _end, chapter_sentences = item
+        chapter_text = sample_chapter_text(chapter_sentences)
+        return generate_title(chapter_text, title, language)
+
+    chapter_titles = ollama_wrapper.parallel_map(
+        title_for_chapter, non_empty, desc="Generating chapter titles"
+    )
+    return [
+        Chapter(chapter_title, start, end - start)
+        for (start, end, _), chapter_title in zip(non_empty, chapter_titles, strict=True)
+    ]
+
+
+def bucket_sentences_by_time(sentences, seconds_pairs):
+    """Single pass over sentences: bucket i gets sentences with start_i <= start < end_i."""
+    starts = [start for start, _ in seconds_pairs]
+    buckets = [[] for _ in seconds_pairs]
+    for sentence in sentences:
+        index = bisect.bisect_right(starts, sentence["start"]) - 1
+        if index >= 0 and sentence["start"] < seconds_pairs[index][1]:
+            buckets[index].append(sentence)
+    return buckets
+
+
+CHAPTER_TITLE_CHAR_BUDGET = 6000  # ~1500 tokens
+CHAPTER_TITLE_EXCERPTS = 8
+
+
+def sample_chapter_text(chapter_sentences, char_budget=CHAPTER_TITLE_CHAR_BUDGET):
+    """
+    Chapter text for title generation: whole text if it fits the budget,
+    otherwise evenly spaced excerpts of consecutive sentences that together fit it.
+    """
+    texts = [sentence["sentence"] for sentence in chapter_sentences]
+    full_text = " ".join(texts)
+    if len(full_text) <= char_budget:
+        return full_text
+    excerpt_budget = char_budget // CHAPTER_TITLE_EXCERPTS
+    step = len(texts) / CHAPTER_TITLE_EXCERPTS
+    excerpts = []
+    for i in range(CHAPTER_TITLE_EXCERPTS):
+        index = int(i * step)
+        excerpt = ""
+        while index < len(texts) and len(excerpt) + len(texts[index]) < excerpt_budget:
+            excerpt += " " + texts[index]
+            index += 1
+        if not excerpt and index < len(texts):
+            excerpt = texts[index][:excerpt_budget]
+        excerpts.append(excerpt.strip())
+    return " ... ".join(excerpt for excerpt in excerpts if excerpt)
 
 
 def create_initial_model(title, final_chapters, sentence_segments, images_with_seconds, images_dir):
@@ -718,31 +923,54 @@ def create_initial_model(title, final_chapters, sentence_segments, images_with_s
 
 
 def process_model(model, language):
+    paragraphs = [item[1] for item in model if item[0] == "p"]
+    fixed_paragraphs = iter(fix_grammar_in_paragraphs(paragraphs, language))
     newer_model = []
     for item in model:
         if item[0] == "p":
-            old_text = item[1]
             speaker_id = item[2] if len(item) > 2 else None
-            text = fix_grammar_with_llm(old_text, language)
-            newer_model.append(("p", text, speaker_id))
+            newer_model.append(("p", next(fixed_paragraphs), speaker_id))
         else:
             newer_model.append(item)
     return newer_model
 
-def translate_model(model, language):
-    newer_model = []
+def translation_requests(model):
+    """
+    (item, context) of every block translate_model translates. Contexts are the source texts
+    of preceding paragraphs, so all blocks can be sent at once.
+    """
+    requests = []
     previous_blocks = []
-    for item in tqdm(model, desc="Translating model"):
+    for item in model:
         if item[0] in ["p", "h1", "h2"]:
             old_text = item[1]
-            speaker_id = item[2] if len(item) > 2 else None
             context = '\n\n'.join(previous_blocks) if item[0] == "p" and len(previous_blocks) else None
-            text = ollama_wrapper.translate(old_text, language, language_to=get_config().translate_to, context=context)
+            requests.append((item, context))
             if item[0] == "p":
                 previous_blocks = previous_blocks + [old_text]
                 if len(previous_blocks) > 2:
                     previous_blocks = previous_blocks[1:]
-            newer_model.append((item[0], text, speaker_id))
+    return requests
+
+
+def translate_model(model, language, translate_to):
+    requests = translation_requests(model)
+    texts = [item[1] for item, _context in requests]
+    contexts = [context for _item, context in requests]
+    translations = iter(
+        ollama_wrapper.translate_many(
+            texts,
+            language,
+            language_to=translate_to,
+            contexts=contexts,
+            desc="Translating model",
+        )
+    )
+    newer_model = []
+    for item in model:
+        if item[0] in ["p", "h1", "h2"]:
+            speaker_id = item[2] if len(item) > 2 else None
+            newer_model.append((item[0], next(translations), speaker_id))
         else:
             newer_model.append(item)
     return newer_model
@@ -777,8 +1005,10 @@ def select_cover(images_dir, images, video_url):
     return images_dir + "/" + random.choice(images)
 
 
-def create_output_filename(title):
+def create_output_filename(title, translate_to=None):
     ext = get_config().output_format
+    if translate_to and len(get_translate_targets()) > 1:
+        return text_helper.clean_title(title) + "_" + translate_to + "." + ext
     return text_helper.clean_title(title) + "." + ext
 
 
@@ -812,66 +1042,61 @@ def model_to_html(model, title):
     return html_file
 
 
-def add_seconds_to_images(images, count, duration):  # duration in seconds
+def add_seconds_to_images(images, count, duration, images_dir=None):  # duration in seconds
+    # real presentation timestamps written by split_video, estimated from the index otherwise
+    timestamps = load_frame_timestamps(images_dir) if images_dir else None
     result = []  # (seconds, filename)
     for image in images:
-        index = int(image.split(".")[0])  # '047.jpg' -> 47
-        seconds = index * duration / count
+        if timestamps and image in timestamps:
+            seconds = timestamps[image]
+        else:
+            index = int(image.split(".")[0])  # '047.jpg' -> 47
+            seconds = index * duration / count
         result.append((seconds, image))
-    return result
+    return sorted(result)
 
 
 def split_video(video_filename):  # audio_filename, screenshots_dir
-    original_video_file = video_filename
     temp_dir_name = generate_random_filename("screenshots")
     os.makedirs(get_abs_path(temp_dir_name), exist_ok=True)
 
     try:
-        duration = _probe_duration_seconds(video_filename)
+        media_info = probe_media(video_filename)
     except Exception as e:
         # Log diagnostics to aid debugging and stop early if we cannot get duration
-        logger.debug("FFPROBE duration probe failed: %s", e)
+        logger.debug("FFPROBE probe failed: %s", e)
         raise
+    duration = int(media_info.duration)
 
     is_audio = video_filename.split(".")[-1] in ["aac", "ogg", "mp3", "wav"]
 
     if is_audio:
         return video_filename, temp_dir_name, duration
 
-    "Probe audio codec via ffmpeg banner (avoid unsupported ffprobe flags)"
-    codec = _probe_audio_codec(original_video_file)
+    codec = media_info.audio_codec
     logger.debug(f"Audio codec detected: {codec}")
 
-    "ffmpeg -i input_video.mp4 -vn -acodec copy output_audio.mp3"
     if codec == "vorbis":
         codec = "ogg"
     if not codec:
-        # Fallback: transcode to mp3 to ensure extraction works on unknown codecs
-        codec = "mp3"
-        audio_file = generate_random_filename("output_audion", codec)
-        extract_audio = ["ffmpeg", "-i", video_filename, "-vn", "-acodec", "libmp3lame", audio_file]
+        # unknown codec can not be copied: decode straight to the asr format,
+        # normalize_audio then reuses the file instead of decoding it again
+        audio_file = generate_random_filename("output_audio", "wav")
+        audio_codec_args = ASR_AUDIO_ARGS
     else:
         audio_file = generate_random_filename("output_audio", codec)
-        extract_audio = ["ffmpeg", "-i", video_filename, "-vn", "-acodec", "copy", audio_file]
-    result = _run_in_ffmpeg_container(extract_audio, check=False, text=True, capture_output=True)
+        audio_codec_args = ["-acodec", "copy"]
+    # audio and screenshots with their timestamps in a single decode of the file
+    result, timestamps = extract_audio_and_frames(
+        video_filename, audio_file, audio_codec_args, temp_dir_name
+    )
     logger.debug(
-        f"extract audio command: {extract_audio}\nreturn code: {result.returncode}\nstderr: {result.stderr}\nstdout: {result.stdout}"
+        "split video: return code: %s, %s frames\nstderr: %s",
+        result.returncode,
+        len(timestamps),
+        result.stderr[-2000:] if result.stderr else "",
     )
 
-    "ffmpeg -i input.mp4 -vf fps=1 -vframes 10 screenshot_%04d.jpg"
-    img_filename_template = f"{temp_dir_name}/%04d.jpg"
-    extract_screenshots = [
-        "ffmpeg",
-        "-i",
-        video_filename,
-        "-vf",
-        r'"select=not(mod(n\,100))"',
-        "-vsync",
-        "vfr",
-        img_filename_template,
-    ]
-    result = _run_in_ffmpeg_container(extract_screenshots, text=True, capture_output=True)
-
     return audio_file, temp_dir_name, duration
 
 
@@ -0,0 +1,90 @@
+"""
+Split a 16-bit PCM wav (see ffmpeg_wrapper.normalize_audio) into chunks at quiet points,
+so the chunks can be transcribed independently and merged back by offset.
+Only the audio around each target boundary is read to look for silence.
+"""
+
+import os
+import wave
+from array import array
+
+from src.helpers.filepath_helper import get_abs_path
+
+FRAME_SECONDS = 0.03  # energy is measured per 30 ms frame
+QUIET_FRAMES = 10  # boundary goes into the middle of the quietest 300 ms
+SEARCH_WINDOW_SECONDS = 30  # how far from the even split a boundary may move
+
+
+def _frame_energies(samples, frame_size):
+    energies = []
+    for start in range(0, len(samples) - frame_size + 1, frame_size):
+        frame = samples[start : start + frame_size]
+        energies.append(sum(sample * sample for sample in frame) / frame_size)
+    return energies
+
+
+def _quietest_point(wav, center, sample_rate):
+    """Frame index (in samples) of the quietest stretch within the search window around center."""
+    window = int(SEARCH_WINDOW_SECONDS * sample_rate)
+    start = max(center - window, 0)
+    end = min(center + window, wav.getnframes())
+    wav.setpos(start)
+    samples = array("h", wav.readframes(end - start))
+    frame_size = int(FRAME_SECONDS * sample_rate)
+    energies = _frame_energies(samples, frame_size)
+    if len(energies) < QUIET_FRAMES:
+        return center
+    running = sum(energies[:QUIET_FRAMES])
+    best_sum, best_index = running, 0
+    for i in range(QUIET_FRAMES, len(energies)):
+        running += energies[i] - energies[i - QUIET_FRAMES]
+        if running < best_sum:
+            best_sum, best_index = running, i - QUIET_FRAMES + 1
+    return start + (best_index + QUIET_FRAMES // 2) * frame_size
+
+
+def wav_duration(path) -> float:
+    with wave.open(get_abs_path(path), "rb") as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def extract_clip(path, start_seconds, seconds) -> str:
+    """Copy `seconds` of wav `path` from `start_seconds` into a new wav next to it."""
+    clip_path = os.path.splitext(path)[0] + "_clip.wav"
+    with wave.open(get_abs_path(path), "rb") as wav:
+        sample_rate = wav.getframerate()
+        wav.setpos(int(start_seconds * sample_rate))
+        with wave.open(get_abs_path(clip_path), "wb") as clip:
+            clip.setparams(wav.getparams())
+            clip.writeframes(wav.readframes(int(seconds * sample_rate)))
+    return clip_path
+
+
+def split_at_silence(path, chunks) -> list[tuple[str, float]]:
+    """
+    Split wav `path` (relative to data/) into `chunks` parts of roughly equal length,
+    cutting at the quietest moment near each even boundary.
+    Returns [(chunk path relative to data/, offset in seconds), ...].
+    """
+    with wave.open(get_abs_path(path), "rb") as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError(f"{path} is not a 16-bit mono wav")
+        sample_rate = wav.getframerate()
+        total = wav.getnframes()
+        boundaries = [0]
+        for i in range(1, chunks):
+            boundaries.append(_quietest_point(wav, total * i // chunks, sample_rate))
+        boundaries.append(total)
+
+        base, _ = os.path.splitext(path)
+        result = []
+        for i, (start, end) in enumerate(zip(boundaries, boundaries[1:], strict=False)):
+            if end <= start:
+                continue
+            chunk_path = f"{base}_chunk{i:02d}.wav"
+            wav.setpos(start)
+            with wave.open(get_abs_path(chunk_path), "wb") as chunk:
+                chunk.setparams(wav.getparams())
+                chunk.writeframes(wav.readframes(end - start))
+            result.append((chunk_path, start / sample_rate))
+    return result
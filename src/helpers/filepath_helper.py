@@ -10,6 +10,11 @@ def generate_random_filename(prefix: str, extension: str = None) -> str:
         return f"{prefix}_{uuid.uuid4()}.{extension}"
 
 
+def temp_path_for(path: str) -> str:
+    """Unique file next to `path` to write into before os.replace() moves it in place."""
+    return f"{path}.{uuid.uuid4()}.tmp"
+
+
 def normalize_filepath_to_data(filepath) -> str:
     # Normalize path for ffmpeg container: make it relative to data/ when possible
     data_dir = Path("data").resolve()
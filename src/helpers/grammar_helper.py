@@ -1,74 +1,182 @@
+import bisect
 import re
+from collections import Counter
 
+from src.helpers import grammar_policy_helper
+from src.pipeline import record_trace
 from src.wrappers import language_tool_wrapper as language_tool_wrapper
 from src.wrappers import ollama_wrapper as ollama_wrapper
 
+# paragraphs are joined into documents of about this size for one LanguageTool request
+CHECK_BATCH_CHARS = 20000
+PARAGRAPH_SEPARATOR = "\n\n"
+CONTEXT_CHARS = 40
+MAX_REPLACEMENTS = 4
 
-def fix_grammar_with_llm(text, language):
+
+def _utf16_offsets(text):
     """
-    Fix grammar in text using LanguageTool and LLM (Ollama).
+    UTF-16 offset of every character of text and of its end, None when they equal the indexes.
+    LanguageTool counts offsets in UTF-16 code units, characters outside the BMP (emoji) take two.
+    """
+    if all(ord(char) <= 0xFFFF for char in text):
+        return None
+    offsets = [0]
+    for char in text:
+        offsets.append(offsets[-1] + (2 if ord(char) > 0xFFFF else 1))
+    return offsets
 
-    Args:
-        text (str): The text to fix
-        language (str): The language code (e.g., 'en-US')
+
+def _check_paragraphs(paragraphs, language):
+    """
+    Check paragraphs with as few LanguageTool requests as possible,
+    batches are checked concurrently.
+    Paragraphs are joined with blank lines, match offsets are mapped back to paragraphs.
 
     Returns:
-        str: The fixed text
+        list: list of matches (offsets relative to the paragraph) for each paragraph
     """
-    # Normalize spaces in text
-    text = re.sub(r"\s+", " ", text)
+    # batches of (index of first paragraph, offsets of paragraphs inside the joined text)
+    batches = []
+    batch_start = 0
+    while batch_start < len(paragraphs):
+        starts = []
+        length = 0
+        batch_end = batch_start
+        while batch_end < len(paragraphs) and (
+            batch_end == batch_start or length + len(paragraphs[batch_end]) <= CHECK_BATCH_CHARS
+        ):
+            starts.append(length)
+            length += len(paragraphs[batch_end]) + len(PARAGRAPH_SEPARATOR)
+            batch_end += 1
+        batches.append((batch_start, starts))
+        batch_start = batch_end
+
+    texts = [
+        PARAGRAPH_SEPARATOR.join(paragraphs[batch_start : batch_start + len(starts)])
+        for batch_start, starts in batches
+    ]
+    responses = language_tool_wrapper.check_texts_with_language_tool_structured(texts, language)
+    matches_by_paragraph = [[] for _ in paragraphs]
+    for (batch_start, starts), text, response in zip(batches, texts, responses, strict=True):
+        utf16_offsets = _utf16_offsets(text)
+        for match in response.matches:
+            if utf16_offsets is not None:
+                start = bisect.bisect_left(utf16_offsets, match.offset)
+                end = bisect.bisect_left(utf16_offsets, match.offset + match.length)
+                match.offset, match.length = start, end - start
+            index = bisect.bisect_right(starts, match.offset) - 1
+            paragraph_offset = match.offset - starts[index]
+            if paragraph_offset + match.length > len(paragraphs[batch_start + index]):
+                continue  # match spans the separator
+            match.offset = paragraph_offset
+            matches_by_paragraph[batch_start + index].append(match)
+    return matches_by_paragraph
 
-    # Get LanguageTool results
-    structured_response = language_tool_wrapper.check_text_with_language_tool_structured(
-        text, language
-    )
 
-    # Sort matches by offset to process them in order
-    matches = sorted(structured_response.matches, key=lambda m: m.offset)
+def _match_end(match):
+    return match.offset + match.length
 
-    # Track offset adjustments as we apply fixes
-    offset_adjustment = 0
-    fixed_text = text
 
+def _fix_paragraph(text, matches):
+    """
+    Apply LanguageTool matches to one paragraph according to the rule policy,
+    matches left to the LLM are arbitrated by one request.
+
+    Returns:
+        tuple: fixed text and a Counter of applied policy actions
+    """
+    matches = sorted(
+        [match for match in matches if len(match.replacements) > 0], key=lambda m: m.offset
+    )
+    # drop overlapping matches, fixes are chosen independently and applied together
+    non_overlapping = []
     for match in matches:
-        if len(match.replacements) > 0:
-            # Adjust the offset based on previous fixes
-            adjusted_offset = match.offset + offset_adjustment
-            adjusted_end = adjusted_offset + match.length
-
-            # Create options dictionary
-            options = {}
-
-            # Add current text as first option
-            current_text = fixed_text[adjusted_offset:adjusted_end]
-            options["a"] = current_text
-            best_option = "a"
-            if current_text.lower() == current_text:  # ignore names
-                for i, replacement in enumerate(
-                    match.replacements[:4]
-                ):  # Limit to 4 additional options
-                    option_key = chr(98 + i)  # b, c, d, e
-                    options[option_key] = replacement.value
-                llm_options = {}
-                for key in options:
-                    llm_options[key] = (
-                        fixed_text[max(0, adjusted_offset - 40) : adjusted_offset]
-                        + options[key]
-                        + fixed_text[adjusted_end : min(adjusted_end + 40, len(fixed_text))]
-                    )
-                best_option = ollama_wrapper.choose_best_option(
-                    fixed_text, match.message, llm_options
+        if non_overlapping and match.offset < _match_end(non_overlapping[-1]):
+            continue
+        non_overlapping.append(match)
+
+    chosen = {}  # match index -> replacement
+    actions = Counter()
+    errors = []
+    error_match_indexes = []
+    error_options = []
+    for i, match in enumerate(non_overlapping):
+        current_text = text[match.offset : match.offset + match.length]
+        action = grammar_policy_helper.get_rule_action(match.rule)
+        if action == grammar_policy_helper.LLM and current_text.lower() != current_text:
+            action = grammar_policy_helper.IGNORE  # ignore names
+        actions[action] += 1
+        if action == grammar_policy_helper.AUTO:
+            chosen[i] = match.replacements[0].value
+        if action != grammar_policy_helper.LLM:
+            continue
+        options = {"a": current_text}
+        for j, replacement in enumerate(match.replacements[:MAX_REPLACEMENTS]):
+            options[chr(98 + j)] = replacement.value  # b, c, d, e
+        before = text[max(0, match.offset - CONTEXT_CHARS) : match.offset]
+        after = text[match.offset + match.length : match.offset + match.length + CONTEXT_CHARS]
+        llm_options = {key: before + value + after for key, value in options.items()}
+        errors.append((match.message, llm_options))
+        error_match_indexes.append(i)
+        error_options.append(options)
+
+    if errors:
+        best_options = ollama_wrapper.choose_best_options(text, errors)
+        for i, options, best_option in zip(
+            error_match_indexes, error_options, best_options, strict=True
+        ):
+            chosen[i] = options.get(best_option, options["a"])
+            if best_option in options:
+                grammar_policy_helper.record_decision(
+                    non_overlapping[i].rule.id, list(options).index(best_option)
                 )
 
-            chosen_replacement = options.get(best_option, current_text)
+    result = []
+    last_index = 0
+    for i, match in enumerate(non_overlapping):
+        result.append(text[last_index : match.offset])
+        result.append(chosen.get(i, text[match.offset : match.offset + match.length]))
+        last_index = match.offset + match.length
+    result.append(text[last_index:])
+    return "".join(result), actions
+
 
-            # Apply the fix to the text
-            fixed_text = (
-                fixed_text[:adjusted_offset] + chosen_replacement + fixed_text[adjusted_end:]
-            )
+def fix_grammar_in_paragraphs(paragraphs, language):
+    """
+    Fix grammar in many paragraphs using LanguageTool and LLM (Ollama).
+    LanguageTool checks paragraphs in large batches, LLM gets one request per paragraph
+    with all its ambiguous matches, paragraphs are arbitrated concurrently.
+
+    Args:
+        paragraphs (list[str]): The texts to fix
+        language (str): The language code (e.g., 'en-US')
 
-            # Update offset adjustment for subsequent matches
-            old_length = match.length
-            new_length = len(chosen_replacement)
-            offset_adjustment += new_length - old_length
-    return fixed_text
+    Returns:
+        list[str]: The fixed texts
+    """
+    # Normalize spaces in text
+    paragraphs = [re.sub(r"\s+", " ", text) for text in paragraphs]
+    matches_by_paragraph = _check_paragraphs(paragraphs, language)
+    results = ollama_wrapper.parallel_map(
+        lambda item: _fix_paragraph(*item),
+        list(zip(paragraphs, matches_by_paragraph, strict=True)),
+        desc="Fixing grammar",
+    )
+    grammar_policy_helper.save_stats()
+    record_trace("grammar_rule_actions", dict(sum((actions for _, actions in results), Counter())))
+    return [text for text, _ in results]
+
+
+def fix_grammar_with_llm(text, language):
+    """
+    Fix grammar in text using LanguageTool and LLM (Ollama).
+
+    Args:
+        text (str): The text to fix
+        language (str): The language code (e.g., 'en-US')
+
+    Returns:
+        str: The fixed text
+    """
+    return fix_grammar_in_paragraphs([text], language)[0]
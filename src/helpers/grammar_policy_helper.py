@@ -0,0 +1,103 @@
+"""
+What to do with a LanguageTool match: apply the first replacement (auto), let the LLM choose
+(llm) or keep the text (ignore). Decided by rule id, then by issue type.
+LLM decisions are counted per rule in data/, rules whose first replacement the LLM
+always picks are promoted to auto.
+"""
+
+import json
+import logging
+import os
+import threading
+
+from src.config import get_config
+from src.helpers.filepath_helper import get_abs_path
+
+logger = logging.getLogger(__name__)
+
+
+AUTO = "auto"
+LLM = "llm"
+IGNORE = "ignore"
+
+# keys are rule ids or LanguageTool issue types, config.grammar_rule_policy overrides them
+DEFAULT_RULE_POLICY = {
+    "WORD_REPEAT_RULE": AUTO,
+    "ENGLISH_WORD_REPEAT_RULE": AUTO,
+    "Two_PREP": AUTO,
+    "WHITESPACE_RULE": AUTO,
+    "COMMA_PARENTHESIS_WHITESPACE": AUTO,
+    "DOUBLE_PUNCTUATION": AUTO,
+    "Many_PNN": IGNORE,
+    "OPREDELENIA": IGNORE,
+    "whitespace": AUTO,
+    "duplication": AUTO,
+    "style": IGNORE,
+}
+
+RULE_STATS_FILENAME = "grammar_rule_stats.json"
+
+_stats = None
+_lock = threading.Lock()
+
+
+def _stats_path():
+    return get_abs_path(RULE_STATS_FILENAME)
+
+
+def _load_stats():
+    global _stats
+    if _stats is None:
+        try:
+            with open(_stats_path(), encoding="utf-8") as f:
+                _stats = json.load(f)
+        except (OSError, ValueError):
+            _stats = {}
+    return _stats
+
+
+def _is_promoted(rule_id):
+    cfg = get_config()
+    min_decisions = cfg.grammar_auto_promote_after if cfg else 0
+    if not min_decisions:
+        return False
+    rule_stats = _load_stats().get(rule_id)
+    if not rule_stats:
+        return False
+    return rule_stats["first"] >= min_decisions and rule_stats["first"] == rule_stats["total"]
+
+
+def get_rule_action(rule) -> str:
+    """Action for a LanguageTool Rule: auto, llm or ignore."""
+    cfg = get_config()
+    policy = dict(DEFAULT_RULE_POLICY)
+    if cfg and cfg.grammar_rule_policy:
+        policy.update(cfg.grammar_rule_policy)
+    if rule.id in policy:
+        return policy[rule.id]
+    with _lock:
+        if _is_promoted(rule.id):
+            return AUTO
+    if rule.issueType in policy:
+        return policy[rule.issueType]
+    return LLM
+
+
+def record_decision(rule_id, chosen_index):
+    """chosen_index: 0 kept the original text, 1 first replacement, 2+ other replacements."""
+    with _lock:
+        rule_stats = _load_stats().setdefault(rule_id, {"total": 0, "first": 0, "kept": 0})
+        rule_stats["total"] += 1
+        if chosen_index == 0:
+            rule_stats["kept"] += 1
+        elif chosen_index == 1:
+            rule_stats["first"] += 1
+
+
+def save_stats():
+    with _lock:
+        if _stats is None:
+            return
+        os.makedirs(os.path.dirname(_stats_path()), exist_ok=True)
+        with open(_stats_path(), "w", encoding="utf-8") as f:
+            json.dump(_stats, f, indent=4, ensure_ascii=False)
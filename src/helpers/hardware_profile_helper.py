@@ -0,0 +1,214 @@
+"""
+Pick model sizes, quantisation, whisper compute type and LLM parallelism
+from the RAM/VRAM/CPU cores of the machine (detected at start-up or taken from config).
+"""
+
+import logging
+import os
+import subprocess
+import threading
+from dataclasses import asdict, dataclass
+
+import src.config as config
+from src import pipeline
+from src.helpers import whisper_autotune_helper
+from src.wrappers import docker_wrapper
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HardwareInfo:
+    ram_gb: float
+    vram_gb: float
+    cpu_cores: int
+    gpu: bool
+
+
+@dataclass
+class ModelProfile:
+    name: str
+    llm_model: str
+    translate_model: str
+    whisper_model: str
+    whisper_compute_type: str
+    whisper_beam_size: int
+    whisper_threads: int
+    llm_parallel: int  # concurrent requests the local ollama serves (OLLAMA_NUM_PARALLEL)
+    whisper_workers: int = 1  # whisper processes transcribing chunks of the audio in parallel
+    whisper_batch_size: int = 8
+
+
+WHISPER_THREADS_PER_WORKER = 4
+WHISPER_RAM_GB = {"base": 1, "small": 2}  # int8 model plus decoding buffers, per process
+
+_hardware: HardwareInfo | None = None
+_profile: ModelProfile | None = None
+_lock = threading.Lock()
+
+
+def _detect_ram_gb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024**3
+    except (ValueError, OSError, AttributeError):
+        return 0.0
+
+
+def _detect_vram_gb():
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", "--query-gpu=memory.total", "--format=csv,noheader,nounits"],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return 0.0
+    if result.returncode != 0:
+        return 0.0
+    # several gpus: models are not split across them, the largest one matters
+    sizes = [float(line) for line in result.stdout.split() if line.strip()]
+    return max(sizes, default=0.0) / 1024
+
+
+def _docker_has_gpu():
+    try:
+        return docker_wrapper._is_gpu_available()
+    except Exception as e:
+        # llm may run on remote endpoints, docker is not required to pick a profile
+        logger.debug("docker is not available: %s", e)
+        return False
+
+
+def detect_hardware() -> HardwareInfo:
+    cfg = config.get_config()
+    ram_gb = cfg.ram_gb if cfg and cfg.ram_gb is not None else _detect_ram_gb()
+    cpu_cores = cfg.cpu_cores if cfg and cfg.cpu_cores is not None else os.cpu_count() or 1
+    # whisper and ollama get the gpu only when docker has a gpu runtime, the same check
+    # the containers are started with; the card size only picks the models
+    gpu = _docker_has_gpu()
+    if cfg and cfg.vram_gb is not None:
+        vram_gb = cfg.vram_gb
+    else:
+        vram_gb = _detect_vram_gb()
+        if gpu and not vram_gb:
+            # docker sees a gpu but nvidia-smi is not on the host, assume a 12GB card
+            vram_gb = 12.0
+    return HardwareInfo(
+        ram_gb=round(ram_gb, 1), vram_gb=round(vram_gb, 1), cpu_cores=cpu_cores, gpu=gpu
+    )
+
+
+def _whisper_workers(hardware: HardwareInfo, ram_per_worker):
+    # leave half of the RAM to ollama
+    by_ram = int(hardware.ram_gb / 2 // ram_per_worker)
+    return max(min(hardware.cpu_cores // WHISPER_THREADS_PER_WORKER, by_ram), 1)
+
+
+def choose_profile(hardware: HardwareInfo) -> ModelProfile:
+    threads = max(hardware.cpu_cores, 1)
+    if hardware.gpu and hardware.vram_gb >= 16:
+        return ModelProfile(
+            "gpu-large", "ministral-3:8b", "hy-mt1.5-7b:q8", "large-v2", "float16", 10, threads, 4
+        )
+    if hardware.gpu and hardware.vram_gb >= 10:
+        return ModelProfile(
+            "gpu-medium", "ministral-3:8b", "hy-mt1.5-7b:q4", "large-v2", "float16", 10, threads, 2
+        )
+    if hardware.gpu and hardware.vram_gb >= 6:
+        return ModelProfile(
+            "gpu-small", "ministral-3:8b", "hy-mt1.5-7b:q4", "medium", "int8_float16", 5, threads, 1
+        )
+    # cpu only (or a gpu too small for the models): whole models live in RAM.
+    # one whisper process does not scale past a few threads, chunks are transcribed in parallel
+    if hardware.ram_gb >= 16:
+        parallel = 2 if hardware.cpu_cores >= 16 else 1
+        workers = _whisper_workers(hardware, WHISPER_RAM_GB["small"])
+        return ModelProfile(
+            "cpu",
+            "ministral-3:8b",
+            "hy-mt1.5-7b:q4",
+            "small",
+            "int8",
+            4,
+            threads // workers,
+            parallel,
+            workers,
+        )
+    workers = _whisper_workers(hardware, WHISPER_RAM_GB["base"])
+    return ModelProfile(
+        "cpu-low-memory",
+        "ministral-3:3b",
+        "hy-mt1.5-7b:q4",
+        "base",
+        "int8",
+        2,
+        threads // workers,
+        1,
+        workers,
+    )
+
+
+def _apply_overrides(profile: ModelProfile) -> ModelProfile:
+    cfg = config.get_config()
+    if not cfg:
+        return profile
+    for name in ["llm_model", "translate_model", "whisper_model", "whisper_compute_type"]:
+        value = getattr(cfg, name)
+        if value:
+            setattr(profile, name, value)
+    if cfg.whisper_workers:
+        cores = cfg.cpu_cores or os.cpu_count() or 1
+        profile.whisper_workers = cfg.whisper_workers
+        profile.whisper_threads = max(cores // cfg.whisper_workers, 1)
+    return profile
+
+
+def _apply_whisper_tuning(profile: ModelProfile, settings: dict) -> ModelProfile:
+    for name in whisper_autotune_helper.TUNED_FIELDS:
+        if name in settings:
+            setattr(profile, name, settings[name])
+    # explicit config values win over calibration
+    return _apply_overrides(profile)
+
+
+def _record_profile():
+    pipeline.record_trace(
+        "hardware_profile", {"hardware": asdict(_hardware), "profile": asdict(_profile)}
+    )
+
+
+def whisper_tuning_key() -> str:
+    profile = get_profile()
+    return whisper_autotune_helper.machine_key(_hardware, profile.whisper_model)
+
+
+def get_hardware() -> HardwareInfo:
+    get_profile()
+    return _hardware
+
+
+def set_whisper_tuning(settings: dict) -> None:
+    """Use calibrated whisper settings for the rest of the run."""
+    with _lock:
+        _apply_whisper_tuning(_profile, settings)
+        logger.info("whisper settings tuned: %s", _profile)
+        _record_profile()
+
+
+def get_profile() -> ModelProfile:
+    global _hardware, _profile
+    with _lock:
+        if _profile is None:
+            _hardware = detect_hardware()
+            _profile = _apply_overrides(choose_profile(_hardware))
+            tuning = whisper_autotune_helper.load_tuning(
+                whisper_autotune_helper.machine_key(_hardware, _profile.whisper_model)
+            )
+            if tuning:
+                _apply_whisper_tuning(_profile, tuning["settings"])
+            logger.info("hardware %s, model profile %s", _hardware, _profile)
+        if pipeline.get_trace("hardware_profile") is None:
+            # the profile is chosen once per process, the trace is written per job
+            _record_profile()
+        return _profile
@@ -0,0 +1,155 @@
+"""
+Reduce an html page to the minimal evidence an LLM needs to answer one question about it
+(json-ld, meta tags, headings, candidate links, visible text), cut to a hard token budget.
+"""
+
+import json
+import re
+
+from bs4 import BeautifulSoup
+
+# rough estimate, ollama models use their own tokenizers which are not available on the host
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 3000
+PROMPT_TOKEN_BUDGETS = {
+    "ministral-3:8b": 3000,
+    "ministral-3:3b": 2000,
+}
+
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".ogg", ".oga", ".opus", ".wav", ".aac", ".flac")
+RSS_HINTS = ("rss", "feed", "atom", ".xml")
+META_KEYS = (
+    "title",
+    "description",
+    "author",
+    "og:title",
+    "og:description",
+    "og:site_name",
+    "og:audio",
+    "og:url",
+    "twitter:title",
+    "twitter:description",
+    "twitter:player:stream",
+)
+
+# sections in order of priority for each question
+QUESTION_SECTIONS = {
+    "description": ["meta", "json_ld", "headings", "text"],
+    "title": ["meta", "headings", "json_ld", "text"],
+    "rss_links": ["rss_links", "meta", "json_ld"],
+    "audio_links": ["audio_links", "meta", "json_ld", "headings"],
+}
+
+
+def get_token_budget(model: str | None) -> int:
+    return PROMPT_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+
+def _collapse(text):
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def _json_ld(soup):
+    lines = []
+    for script in soup.find_all("script", type="application/ld+json"):
+        raw = script.string or script.get_text()
+        try:
+            lines.append(json.dumps(json.loads(raw), ensure_ascii=False, separators=(",", ":")))
+        except Exception:
+            lines.append(_collapse(raw))
+    return lines
+
+
+def _meta(soup):
+    lines = []
+    if soup.title and soup.title.get_text(strip=True):
+        lines.append(f"title: {_collapse(soup.title.get_text())}")
+    for meta in soup.find_all("meta"):
+        key = meta.get("property") or meta.get("name") or meta.get("itemprop")
+        content = meta.get("content")
+        if key and content and key.lower() in META_KEYS:
+            lines.append(f"{key}: {_collapse(content)}")
+    return lines
+
+
+def _headings(soup):
+    return [
+        f"{tag.name}: {_collapse(tag.get_text(' '))}"
+        for tag in soup.find_all(["h1", "h2", "h3"])
+        if tag.get_text(strip=True)
+    ]
+
+
+def _links(soup):
+    for tag in soup.find_all(["a", "link", "audio", "source", "enclosure"]):
+        url = tag.get("href") or tag.get("src") or tag.get("url")
+        if not url or url.startswith(("#", "javascript:", "mailto:")):
+            continue
+        yield tag, url
+
+
+def _rss_links(soup):
+    lines = []
+    for tag, url in _links(soup):
+        kind = (tag.get("type") or "").lower()
+        if "rss" in kind or "atom" in kind or any(hint in url.lower() for hint in RSS_HINTS):
+            lines.append(f"{_collapse(tag.get_text(' ')) or tag.name}: {url}")
+    return list(dict.fromkeys(lines))
+
+
+def _audio_links(soup):
+    lines = []
+    for tag, url in _links(soup):
+        kind = (tag.get("type") or "").lower()
+        path = url.lower().split("?")[0]
+        if tag.name in ["audio", "source", "enclosure"] or "audio" in kind:
+            lines.append(f"{tag.name}: {url}")
+        elif path.endswith(AUDIO_EXTENSIONS):
+            lines.append(f"{_collapse(tag.get_text(' ')) or tag.name}: {url}")
+    return list(dict.fromkeys(lines))
+
+
+def _text(soup):
+    body = soup.body or soup
+    for trash in body.find_all(["script", "style", "noscript", "svg", "nav", "footer", "form"]):
+        trash.extract()
+    return [_collapse(body.get_text(" "))]
+
+
+SECTION_EXTRACTORS = {
+    "json_ld": ("json-ld", _json_ld),
+    "meta": ("meta tags", _meta),
+    "headings": ("headings", _headings),
+    "rss_links": ("candidate rss links", _rss_links),
+    "audio_links": ("candidate audio links", _audio_links),
+    "text": ("visible text", _text),
+}
+
+
+def extract_evidence(html_content: str, question: str, token_budget: int) -> str:
+    """
+    Build a compact text with the parts of the page relevant to `question`
+    (one of QUESTION_SECTIONS keys), never longer than `token_budget` tokens.
+    """
+    soup = BeautifulSoup(html_content or "", "html.parser")
+    char_budget = token_budget * CHARS_PER_TOKEN
+    result = []
+    used = 0
+    for section in QUESTION_SECTIONS[question]:
+        header, extractor = SECTION_EXTRACTORS[section]
+        lines = [line for line in extractor(soup) if line]
+        if not lines:
+            continue
+        header_line = f"{header}:"
+        if used + len(header_line) + 1 >= char_budget:
+            break
+        result.append(header_line)
+        used += len(header_line) + 1
+        for line in lines:
+            left = char_budget - used
+            if left <= 0:
+                break
+            line = line[: left - 1]
+            result.append(line)
+            used += len(line) + 1
+    return "\n".join(result)
@@ -2,12 +2,14 @@ import base64
 import logging
 import urllib
 import urllib.parse
+from collections import Counter
 from urllib.parse import urljoin
 
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 
 from src.helpers.filepath_helper import generate_random_filename, get_abs_path, get_rel_path
+from src.pipeline import record_trace
 
 from ..wrappers import ollama_wrapper
 from ..wrappers.readability_wrapper import readability
@@ -17,8 +19,8 @@ from .latex_helper import process_math
 logger = logging.getLogger(__name__)
 
 
-from src.config import get_config
-from src.wrappers.fasttext_wrapper import detect_language
+from src.config import get_translate_targets
+from src.wrappers.fasttext_wrapper import detect_language, detect_languages
 
 
 def save_to_html(title, inner_html):
@@ -242,27 +244,92 @@ def process_images(soup, link):
     return soup
 
 
-def translate_p_tags(soup):
-    if not get_config().translate_to:
+TAGS_TO_TRANSLATE = ["h1", "h2", "h3", "h4", "h5", "h6", "p", "li"]
+UNTRANSLATABLE_TAGS = ["pre", "code", "kbd", "samp", "math", "script", "style"]
+
+
+def _text_outside(tag, excluded_ids):
+    """Text of tag without strings inside untranslatable elements or excluded descendants."""
+    parts = []
+    for string in tag.find_all(string=True):
+        parent = string.parent
+        while parent is not None and parent is not tag:
+            if parent.name in UNTRANSLATABLE_TAGS or id(parent) in excluded_ids:
+                break
+            parent = parent.parent
+        else:
+            parts.append(string.strip())
+    return "".join(parts)
+
+
+def select_tags_to_translate(soup, language, language_to):
+    """
+    Tags worth sending to the translator with their texts, and counts of skipped tags by reason.
+    Code and math are not translated; a tag nested in a translated tag is translated
+    as a part of it, a tag containing only other translatable tags (li > p) is left to them.
+    """
+    skipped = Counter()
+    candidates = [
+        tag
+        for tag in soup.find_all(TAGS_TO_TRANSLATE)
+        if tag.get_text(strip=True) and not tag.find_parent(UNTRANSLATABLE_TAGS)
+    ]
+    candidate_ids = {id(tag) for tag in candidates}
+    unit_ids = set()
+    units = []
+    for tag in candidates:
+        if any(id(parent) in unit_ids for parent in tag.parents):
+            skipped["nested"] += 1
+            continue
+        if tag.find(TAGS_TO_TRANSLATE) and not _text_outside(tag, candidate_ids):
+            skipped["container"] += 1
+            continue
+        unit_ids.add(id(tag))
+        units.append(tag)
+
+    proses = [_text_outside(tag, set()) for tag in units]
+    detected = [None] * len(units)
+    if not text_helper.scripts_differ(language, language_to):
+        # same writing system (en -> de): only a language model tells a translated segment
+        detected = detect_languages(proses)
+    tags = []
+    for tag, prose, detected_language in zip(units, proses, detected, strict=True):
+        if not prose:
+            reason = "code_or_math"
+        else:
+            reason = text_helper.untranslatable_reason(
+                prose, language, language_to, detected_language
+            )
+        if reason:
+            skipped[reason] += 1
+            continue
+        tags.append((tag, tag.get_text(strip=True)))
+    return tags, skipped
+
+
+def translate_p_tags(soup, translate_to=None):
+    translate_to = translate_to or next(iter(get_translate_targets()), None)
+    if not translate_to:
         return soup
     text = soup.get_text(strip=True)
 
     if not text:
         return soup
     language = detect_language(text)
-    if language == get_config().translate_to:
+    if language == translate_to:
         return soup
     if language is None:
         return soup
-    tags_names_to_translate = ["h1", "h2", "h3", "h4", "h5", "h6", "p", "li"]
-    tags_to_translate = [
-        tag for tag_name in tags_names_to_translate for tag in soup.find_all(tag_name)
-    ]
-    for p_tag in tqdm(tags_to_translate, desc="Translating text in html tags"):
-        if p_tag.get_text(strip=True) == "":
-            continue
-        tag_text = p_tag.get_text(strip=True)
-        new_text = ollama_wrapper.translate(tag_text, language, get_config().translate_to)
+    tags_to_translate, skipped = select_tags_to_translate(soup, language, translate_to)
+    record_trace(f"translation_skipped_{translate_to}", dict(skipped))
+    logger.debug("translating %s tags, skipped %s", len(tags_to_translate), dict(skipped))
+    translations = ollama_wrapper.translate_many(
+        [text for _, text in tags_to_translate],
+        language,
+        translate_to,
+        desc="Translating text in html tags",
+    )
+    for (p_tag, _), new_text in zip(tags_to_translate, translations, strict=True):
         if new_text:
             new_tag = BeautifulSoup(f"<{p_tag.name}>{new_text}</{p_tag.name}>", "html.parser")
             p_tag.replace_with(new_tag)
@@ -285,8 +352,10 @@ def _apply_transformation_to_html(input_file, transform_func, prefix, **kwargs):
     return output_filename
 
 
-def translate_html_file(input_file):
-    return _apply_transformation_to_html(input_file, translate_p_tags, "translated")
+def translate_html_file(input_file, translate_to=None):
+    return _apply_transformation_to_html(
+        input_file, translate_p_tags, "translated", translate_to=translate_to
+    )
 
 
 def initial_html_clean_up(input_file, link=""):
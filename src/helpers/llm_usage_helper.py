@@ -0,0 +1,145 @@
+"""
+Accounting of LLM calls: tokens and prefill/generation timings reported by the server,
+aggregated per calling function, per pipeline stage and per model.
+"""
+
+import threading
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class LLMCall:
+    call_site: str
+    stage: str | None
+    model: str
+    prompt_tokens: int = 0
+    prompt_eval_seconds: float = 0.0
+    eval_tokens: int = 0
+    eval_seconds: float = 0.0
+    load_seconds: float = 0.0
+    total_seconds: float = 0.0
+    endpoint: str | None = None
+
+
+_lock = threading.Lock()
+# calls and stage of the job running in this context, thread pools inherit them
+# via pipeline.bind_context, a forked branch of the job gets its own list of calls
+_calls: ContextVar[list[LLMCall] | None] = ContextVar("llm_calls", default=None)
+_current_stage: ContextVar[str | None] = ContextVar("llm_stage", default=None)
+
+
+def _job_calls() -> list[LLMCall]:
+    job_calls = _calls.get()
+    if job_calls is None:
+        job_calls = []
+        _calls.set(job_calls)
+    return job_calls
+
+
+def set_current_stage(stage_name: str | None) -> None:
+    _current_stage.set(stage_name)
+
+
+def reset() -> None:
+    _calls.set([])
+
+
+def fork() -> None:
+    """Continue on a copy of the calls so far, so branches running in parallel do not mix."""
+    with _lock:
+        _calls.set(list(_job_calls()))
+
+
+def record_call(
+    call_site,
+    model,
+    prompt_tokens=0,
+    prompt_eval_seconds=0.0,
+    eval_tokens=0,
+    eval_seconds=0.0,
+    load_seconds=0.0,
+    total_seconds=0.0,
+    endpoint=None,
+) -> LLMCall:
+    call = LLMCall(
+        call_site=call_site,
+        stage=_current_stage.get(),
+        model=model,
+        prompt_tokens=prompt_tokens or 0,
+        prompt_eval_seconds=prompt_eval_seconds or 0.0,
+        eval_tokens=eval_tokens or 0,
+        eval_seconds=eval_seconds or 0.0,
+        load_seconds=load_seconds or 0.0,
+        total_seconds=total_seconds or 0.0,
+        endpoint=endpoint,
+    )
+    with _lock:
+        _job_calls().append(call)
+    return call
+
+
+def _rate(tokens, seconds):
+    return round(tokens / seconds, 1) if seconds > 0 else None
+
+
+def _aggregate(key) -> dict[str, dict]:
+    with _lock:
+        calls = list(_job_calls())
+    result = {}
+    for call in calls:
+        name = getattr(call, key) or "unknown"
+        item = result.setdefault(
+            name,
+            {
+                "calls": 0,
+                "prompt_tokens": 0,
+                "prompt_eval_seconds": 0.0,
+                "eval_tokens": 0,
+                "eval_seconds": 0.0,
+                "load_seconds": 0.0,
+                "total_seconds": 0.0,
+            },
+        )
+        item["calls"] += 1
+        item["prompt_tokens"] += call.prompt_tokens
+        item["prompt_eval_seconds"] += call.prompt_eval_seconds
+        item["eval_tokens"] += call.eval_tokens
+        item["eval_seconds"] += call.eval_seconds
+        item["load_seconds"] += call.load_seconds
+        item["total_seconds"] += call.total_seconds
+    for item in result.values():
+        item["prefill_tokens_per_second"] = _rate(
+            item["prompt_tokens"], item["prompt_eval_seconds"]
+        )
+        item["generation_tokens_per_second"] = _rate(item["eval_tokens"], item["eval_seconds"])
+    return dict(sorted(result.items(), key=lambda kv: -kv[1]["total_seconds"]))
+
+
+def summary() -> dict:
+    return {
+        "by_call_site": _aggregate("call_site"),
+        "by_stage": _aggregate("stage"),
+        "by_model": _aggregate("model"),
+    }
+
+
+def calls() -> list[dict]:
+    with _lock:
+        return [asdict(call) for call in _job_calls()]
+
+
+def print_summary() -> None:
+    by_call_site = _aggregate("call_site")
+    if not by_call_site:
+        return
+    print("LLM usage by call site:")
+    for name, item in by_call_site.items():
+        print(
+            f"  {name}: {item['calls']} calls, {item['total_seconds']:.1f}s total, "
+            f"prefill {item['prompt_tokens']} tok in {item['prompt_eval_seconds']:.1f}s "
+            f"({item['prefill_tokens_per_second'] or 0} tok/s), "
+            f"generation {item['eval_tokens']} tok in {item['eval_seconds']:.1f}s "
+            f"({item['generation_tokens_per_second'] or 0} tok/s), "
+            f"load {item['load_seconds']:.1f}s"
+        )
@@ -1,4 +1,5 @@
 import re
+import zlib
 
 
 def clean_title(title):
@@ -27,7 +28,140 @@ def detect_language(text):
     return language
 
 
+# writing system of languages the translator targets, used for cheap per-segment detection
+LANGUAGE_SCRIPTS = {
+    "en": "latin",
+    "de": "latin",
+    "fr": "latin",
+    "es": "latin",
+    "it": "latin",
+    "pt": "latin",
+    "pl": "latin",
+    "cs": "latin",
+    "nl": "latin",
+    "tr": "latin",
+    "vi": "latin",
+    "id": "latin",
+    "ru": "cyrillic",
+    "uk": "cyrillic",
+    "kk": "cyrillic",
+    "mn": "cyrillic",
+    "zh": "cjk",
+    "ja": "cjk",
+    "ko": "hangul",
+    "ar": "arabic",
+    "fa": "arabic",
+    "he": "hebrew",
+}
+SCRIPT_PATTERNS = {
+    "latin": r"[A-Za-zÀ-ɏ]",
+    "cyrillic": r"[Ѐ-ӿ]",
+    "cjk": r"[\u3040-\u30ff\u4e00-\u9fff]",
+    "hangul": r"[\uac00-\ud7af]",
+    "arabic": r"[\u0600-\u06ff]",
+    "hebrew": r"[\u0590-\u05ff]",
+}
+URL_PATTERN = r"(?:https?://|www\.)\S+|[\w.+-]+@[\w-]+\.[\w.]+"
+CITATION_PATTERN = r"[\[(]\s*\d+(?:\s*[,;–-]\s*\d+)*\s*[\])]"
+
+
+def detect_script(text):
+    """Dominant writing system of the letters in text, None if there are no letters."""
+    counts = {script: len(re.findall(pattern, text)) for script, pattern in SCRIPT_PATTERNS.items()}
+    script, count = max(counts.items(), key=lambda kv: kv[1])
+    return script if count else None
+
+
+def scripts_differ(language, language_to):
+    """The writing system alone tells text in language from text in language_to."""
+    script = LANGUAGE_SCRIPTS.get(language)
+    target_script = LANGUAGE_SCRIPTS.get(language_to)
+    return bool(script and target_script and script != target_script)
+
+
+def untranslatable_reason(text, language=None, language_to=None, detected_language=None):
+    """
+    Why a segment does not need translation (numbers, urls, citations, already in
+    the target language), or None if it should be translated.
+    detected_language: language of the segment detected by a model, for languages
+    sharing a writing system (en -> de), where the script can not tell them apart.
+    """
+    rest = re.sub(URL_PATTERN, " ", text)
+    if rest.strip() != text.strip() and not re.search(r"\w{2,}", re.sub(r"\d", "", rest)):
+        return "url"
+    rest = re.sub(CITATION_PATTERN, " ", rest)
+    if rest.strip() != text.strip() and not re.search(r"[^\W\d_]{2,}", rest):
+        return "citation"
+    if not re.search(r"[^\W\d_]{2,}", rest):
+        return "no_words"  # numbers, punctuation, single-letter formulas
+    script = detect_script(rest)
+    target_script = LANGUAGE_SCRIPTS.get(language_to)
+    if target_script and script == target_script and script != LANGUAGE_SCRIPTS.get(language):
+        return "target_language"
+    if detected_language and detected_language == language_to != language:
+        return "target_language"
+    return None
+
+
 def extract_links(text):
     pattern = r"http[s]?://(?:[a-zA-Zа-яА-Я]|[1][2][3][4][5]|[$-_@.&+]|[!*$$$$,]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
     links = re.findall(pattern, text)
     return links
+
+
+# runs of one punctuation character, e.g. "......" in a table of contents or "|---|---|"
+PUNCTUATION_RUN = re.compile(r"([^\w\s])\1+")
+
+
+def _has_content(text):
+    return any(char.isalnum() for char in text)
+
+
+def find_repeated_tail(text, min_repeats=4, min_period=8, max_period=300):
+    """
+    Length of the shortest chunk the text ends with, repeated at least `min_repeats` times
+    in a row (e.g. an OCR model stuck in a loop), or None.
+    Chunks without letters or digits (dot leaders, table separators) do not count.
+    """
+    for period in range(min_period, max_period + 1):
+        if period * min_repeats > len(text):
+            break
+        chunk = text[-period:]
+        if _has_content(chunk) and all(
+            text[len(text) - (i + 1) * period : len(text) - i * period] == chunk
+            for i in range(1, min_repeats)
+        ):
+            return period
+    return None
+
+
+def is_degenerate(text, window=1200, min_repeats=4, max_compression_ratio=6.0):
+    """
+    Online check for generation loops: the tail of `text` repeats itself verbatim,
+    its word 3-grams are mostly duplicates, or it compresses too well to be real text.
+    Punctuation-only runs (dot leaders, markdown table rules) are ignored by all three.
+    """
+    tail = text[-window:]
+    if len(tail) < 200:
+        return False
+    if find_repeated_tail(tail, min_repeats) is not None:
+        return True
+    words = [word for word in tail.split() if _has_content(word)]
+    trigrams = list(zip(words, words[1:], words[2:], strict=False))
+    if len(trigrams) >= 30 and len(set(trigrams)) / len(trigrams) < 0.2:
+        return True
+    if len(tail) >= window:
+        squeezed = PUNCTUATION_RUN.sub(r"\1", tail).encode("utf-8")
+        ratio = len(squeezed) / len(zlib.compress(squeezed))
+        if ratio > max_compression_ratio:
+            return True
+    return False
+
+
+def trim_repetition(text, min_repeats=2):
+    """Drop a looping tail, keeping a single occurrence of the repeated chunk."""
+    period = find_repeated_tail(text, min_repeats)
+    while period is not None:
+        text = text[:-period]
+        period = find_repeated_tail(text, min_repeats)
+    return text
@@ -0,0 +1,114 @@
+"""
+Transcripts and diarizations cached in data/ by the hash of the decoded audio
+(the PCM frames of the normalised wav, not the file), so the same recording downloaded
+from another url or in another container format skips ASR. Re-encoded copies decode
+to different samples and are transcribed again.
+Above transcript_cache_mb the least recently used entries are removed.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import wave
+
+from src import pipeline
+from src.config import get_config
+from src.helpers.filepath_helper import get_abs_path, temp_path_for
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_DIR = "transcript_cache"
+READ_FRAMES = 1024 * 1024
+
+_audio_hashes = {}
+_lock = threading.Lock()
+
+
+def audio_hash(audio_path) -> str:
+    abs_path = get_abs_path(audio_path)
+    stat = os.stat(abs_path)
+    memo_key = (abs_path, stat.st_size, stat.st_mtime)
+    with _lock:
+        if memo_key in _audio_hashes:
+            return _audio_hashes[memo_key]
+    digest = hashlib.sha256()
+    try:
+        with wave.open(abs_path, "rb") as wav:
+            params = f"{wav.getframerate()}:{wav.getnchannels()}:{wav.getsampwidth()}"
+            digest.update(params.encode())
+            while frames := wav.readframes(READ_FRAMES):
+                digest.update(frames)
+    except wave.Error:
+        with open(abs_path, "rb") as f:
+            while block := f.read(READ_FRAMES):
+                digest.update(block)
+    result = digest.hexdigest()
+    with _lock:
+        _audio_hashes[memo_key] = result
+    return result
+
+
+def cache_key(audio_path, kind, **params) -> str:
+    """kind: transcript | diarization, params: whatever changes the output (model, prompt...)."""
+    payload = json.dumps(
+        {"audio": audio_hash(audio_path), "kind": kind, **params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(CACHE_DIR, key + ".json")
+
+
+def _record(kind, hit):
+    pipeline.record_trace(f"{kind}_cache", "hit" if hit else "miss")
+
+
+def lookup(key, kind, output_path) -> str | None:
+    """Copy the cached result to output_path (relative to data/), None when not cached."""
+    cached = get_abs_path(_cache_path(key))
+    hit = os.path.isfile(cached)
+    _record(kind, hit)
+    if not hit:
+        return None
+    shutil.copyfile(cached, get_abs_path(output_path))
+    os.utime(cached)  # recently used entries are evicted last
+    logger.info("%s found in cache: %s", kind, key)
+    return output_path
+
+
+def store(key, result_path) -> None:
+    os.makedirs(get_abs_path(CACHE_DIR), exist_ok=True)
+    cached = get_abs_path(_cache_path(key))
+    # written aside and renamed, a concurrent lookup never copies a half-written file
+    tmp_path = temp_path_for(cached)
+    shutil.copyfile(get_abs_path(result_path), tmp_path)
+    os.replace(tmp_path, cached)
+    max_mb = get_config().transcript_cache_mb
+    if max_mb:
+        evict(max_mb * 1024 * 1024)
+
+
+def evict(max_bytes) -> None:
+    """Remove the least recently used entries until the cache fits into max_bytes."""
+    entries = []
+    with os.scandir(get_abs_path(CACHE_DIR)) as scan:
+        for entry in scan:
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _mtime, size, _path in entries)
+    for _mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
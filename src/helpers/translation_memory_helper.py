@@ -0,0 +1,113 @@
+"""
+Persistent translation memory: exact matches of previously translated segments
+keyed on (normalised source text, source language, target language, model).
+"""
+
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextvars import ContextVar
+
+from src.helpers.filepath_helper import get_abs_path
+
+DB_FILENAME = "translation_memory.sqlite"
+
+_lock = threading.Lock()
+_connection = None
+# statistics of the job running in this context, a forked branch of the job counts its own
+_stats: ContextVar[dict | None] = ContextVar("translation_memory_stats", default=None)
+
+
+def _job_stats() -> dict:
+    stats = _stats.get()
+    if stats is None:
+        stats = {"hits": 0, "misses": 0, "duplicates": 0}
+        _stats.set(stats)
+    return stats
+
+
+def normalize(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def _get_connection():
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(get_abs_path(DB_FILENAME), check_same_thread=False)
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                source TEXT NOT NULL,
+                source_language TEXT NOT NULL,
+                target_language TEXT NOT NULL,
+                model TEXT NOT NULL,
+                target TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (source, source_language, target_language, model)
+            )
+            """
+        )
+        _connection.commit()
+    return _connection
+
+
+def lookup(text, source_language, target_language, model) -> str | None:
+    key = (normalize(text), source_language, target_language, model)
+    with _lock:
+        connection = _get_connection()
+        row = connection.execute(
+            "SELECT target FROM translations"
+            " WHERE source = ? AND source_language = ? AND target_language = ? AND model = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            _job_stats()["misses"] += 1
+            return None
+        _job_stats()["hits"] += 1
+        connection.execute(
+            "UPDATE translations SET hits = hits + 1"
+            " WHERE source = ? AND source_language = ? AND target_language = ? AND model = ?",
+            key,
+        )
+        connection.commit()
+        return row[0]
+
+
+def store(text, source_language, target_language, model, translation) -> None:
+    if not normalize(text) or not translation:
+        return
+    with _lock:
+        connection = _get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO translations"
+            " (source, source_language, target_language, model, target, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (normalize(text), source_language, target_language, model, translation, time.time()),
+        )
+        connection.commit()
+
+
+def count_duplicates(count: int) -> None:
+    """Segments not dispatched because an identical segment of the same document was."""
+    with _lock:
+        _job_stats()["duplicates"] += count
+
+
+def reset_stats() -> None:
+    _stats.set({"hits": 0, "misses": 0, "duplicates": 0})
+
+
+def fork_stats() -> None:
+    """Continue counting on a copy, so branches running in parallel do not add up."""
+    with _lock:
+        _stats.set(dict(_job_stats()))
+
+
+def stats() -> dict:
+    with _lock:
+        result = dict(_job_stats())
+    lookups = result["hits"] + result["misses"]
+    result["hit_rate"] = round(result["hits"] / lookups, 3) if lookups else None
+    return result
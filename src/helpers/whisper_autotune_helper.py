@@ -0,0 +1,142 @@
+"""
+Calibrate whisper decoding settings (compute type, beam size, batch size, threads) on a short
+clip: the most accurate setting that reaches the target real-time factor, or the fastest one,
+as long as the word error rate against the profile defaults stays within the bound.
+Results are stored per machine and whisper model in data/ and reused by every later job.
+"""
+
+import json
+import logging
+import os
+import socket
+from dataclasses import replace
+
+from src.helpers.filepath_helper import get_abs_path
+
+logger = logging.getLogger(__name__)
+
+
+CALIBRATION_SECONDS = 60
+TUNING_FILENAME = "whisper_tuning.json"
+TUNED_FIELDS = [
+    "whisper_compute_type",
+    "whisper_beam_size",
+    "whisper_batch_size",
+    "whisper_threads",
+]
+
+
+def machine_key(hardware, whisper_model) -> str:
+    return "|".join(
+        [
+            socket.gethostname(),
+            f"{hardware.cpu_cores}cores",
+            f"{hardware.ram_gb}ram",
+            f"{hardware.vram_gb}vram",
+            whisper_model,
+        ]
+    )
+
+
+def _load_all():
+    try:
+        with open(get_abs_path(TUNING_FILENAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_tuning(key) -> dict | None:
+    return _load_all().get(key)
+
+
+def save_tuning(key, tuning) -> None:
+    tunings = _load_all()
+    tunings[key] = tuning
+    os.makedirs(os.path.dirname(get_abs_path(TUNING_FILENAME)), exist_ok=True)
+    with open(get_abs_path(TUNING_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(tunings, f, indent=4, ensure_ascii=False)
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    reference_words = reference.lower().split()
+    hypothesis_words = hypothesis.lower().split()
+    if not reference_words:
+        return 0.0 if not hypothesis_words else 1.0
+    # word level levenshtein distance, one row at a time
+    previous = list(range(len(hypothesis_words) + 1))
+    for i, reference_word in enumerate(reference_words, 1):
+        current = [i]
+        for j, hypothesis_word in enumerate(hypothesis_words, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (reference_word != hypothesis_word),
+                )
+            )
+        previous = current
+    return previous[-1] / len(reference_words)
+
+
+def search_axes(profile, gpu, fixed=()) -> list[tuple[str, list]]:
+    """Values tried for each setting, one setting at a time, in this order."""
+    beam = profile.whisper_beam_size
+    threads = profile.whisper_threads
+    axes = [
+        ("whisper_compute_type", [profile.whisper_compute_type, "int8_float16" if gpu else "int8"]),
+        ("whisper_beam_size", [beam, max(beam // 2, 1), 2, 1]),
+        ("whisper_batch_size", [8, 16, 32] if gpu else [4, 8]),
+        ("whisper_threads", [threads, max(threads // 2, 1)]),
+    ]
+    return [
+        (name, list(dict.fromkeys(values))) for name, values in axes if name not in fixed
+    ]
+
+
+def pick(results, target_rtf, max_wer):
+    """
+    results: [{"settings", "rtf", "wer"}]. Within the WER bound: the lowest WER among results
+    reaching target_rtf, the lowest real-time factor when none does.
+    """
+    acceptable = [result for result in results if result["wer"] <= max_wer] or results[:1]
+    fast_enough = [result for result in acceptable if result["rtf"] <= target_rtf]
+    if fast_enough:
+        return min(fast_enough, key=lambda result: (result["wer"], result["rtf"]))
+    return min(acceptable, key=lambda result: result["rtf"])
+
+
+def tune(profile, gpu, run, target_rtf, max_wer, fixed=()):
+    """
+    run(candidate profile) -> (transcript text, real-time factor) on the calibration clip.
+    The profile defaults are the reference transcript, settings are searched one after another
+    keeping the best value of the previous ones. Returns (settings, all results).
+    """
+    reference_text, reference_rtf = run(profile)
+    best = {
+        "settings": {name: getattr(profile, name) for name in TUNED_FIELDS},
+        "rtf": reference_rtf,
+        "wer": 0.0,
+    }
+    results = [best]
+    for name, values in search_axes(profile, gpu, fixed):
+        axis_results = [best]
+        for value in values:
+            if value == best["settings"][name]:
+                continue
+            settings = dict(best["settings"], **{name: value})
+            try:
+                text, rtf = run(replace(profile, **settings))
+            except Exception as e:
+                logger.info("whisper calibration: %s failed: %s", settings, e)
+                continue
+            result = {
+                "settings": settings,
+                "rtf": rtf,
+                "wer": round(word_error_rate(reference_text, text), 4),
+            }
+            logger.info("whisper calibration: %s", result)
+            axis_results.append(result)
+        results += axis_results[1:]
+        best = pick(axis_results, target_rtf, max_wer)
+    return best["settings"], results
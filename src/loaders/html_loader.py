@@ -51,9 +51,8 @@ def load_html_page_by_url(url: str) -> str or None:
                     tag.extract()
             with open(f"data/{html_file}_short.html", "w", encoding="utf-8") as f:
                 f.write(str(soap))
-            result = str(soap)
-            result = result[:100000]
-            return result
+            # no truncation here: llm prompts reduce the page with html_evidence_helper
+            return str(soap)
     except Exception as e:
         print(f"Error downloading page: {e}")
         return None
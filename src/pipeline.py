@@ -1,19 +1,81 @@
+import contextvars
 import copy
 import json
 import logging
 import os
+import threading
 import time
 import traceback
 from collections.abc import Callable
-from dataclasses import asdict, dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field, replace
 from typing import Any
 
 from dacite import Config, from_dict
 
+from src.helpers import llm_usage_helper, translation_memory_helper
 from src.helpers.filepath_helper import generate_random_filename, get_abs_path
 
 logger = logging.getLogger(__name__)
 
+# extra sections (model profile, cache statistics...) written into the trace of the current job
+_job_trace: contextvars.ContextVar[dict[str, Any] | None] = contextvars.ContextVar(
+    "job_trace", default=None
+)
+_trace_lock = threading.Lock()
+
+
+def _trace() -> dict[str, Any]:
+    trace = _job_trace.get()
+    if trace is None:
+        trace = {}
+        _job_trace.set(trace)
+    return trace
+
+
+def reset_trace() -> None:
+    _job_trace.set({})
+
+
+def record_trace(section: str, data: Any) -> None:
+    _trace()[section] = data
+
+
+def append_trace(section: str, item: Any) -> None:
+    with _trace_lock:
+        _trace().setdefault(section, []).append(item)
+
+
+def get_trace(section: str, default: Any = None) -> Any:
+    return _trace().get(section, default)
+
+
+def fork_job() -> None:
+    """
+    Give a branch of the job running in this context its own trace and statistics,
+    starting from what the shared stages recorded, so parallel branches do not mix.
+    """
+    with _trace_lock:
+        _job_trace.set(copy.deepcopy(_trace()))
+    llm_usage_helper.fork()
+    translation_memory_helper.fork_stats()
+
+
+def bind_context(func):
+    """
+    `func` running in the context of the caller (job trace, llm stage) when called from
+    a thread pool, which otherwise starts every task in an empty context.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # a context can be entered by one thread at a time
+        return context.copy().run(func, *args, **kwargs)
+
+    return run
+
+
 def copy_arguments(args):
     return copy.deepcopy(args)
 
@@ -55,12 +117,17 @@ class PipelineStage:
     resources: list[PipelineResource] = field(default_factory=list)
     _given_name: str = None
     critical: bool = False
+    needs_word_timings: bool = False  # uses whisperx forced alignment of the transcript
 
     @property
     def name(self):
         return self._given_name or self.func.__name__
 
 
+def needs_word_timings(pipeline: list[PipelineStage]) -> bool:
+    return any(stage.enabled and stage.needs_word_timings for stage in pipeline)
+
+
 def run_with_resources(func, resources: list[PipelineResource], current_args):
     if not resources:
         return func(*current_args)
@@ -71,9 +138,13 @@ def run_with_resources(func, resources: list[PipelineResource], current_args):
         return run_with_resources(func, resources[1:], current_args)
 
 
-def fold_pipeline(pipeline: list[PipelineStage], video):
+def fold_pipeline(pipeline: list[PipelineStage], video, new_job=True):
     current_video = video
     index = 1
+    if new_job:
+        llm_usage_helper.reset()
+        translation_memory_helper.reset_stats()
+        reset_trace()
     active_pipeline = [stage for stage in pipeline if stage.enabled]
     for stage in active_pipeline:
         args = []
@@ -91,6 +162,7 @@ def fold_pipeline(pipeline: list[PipelineStage], video):
             else:
                 args.append(getattr(current_video, input_))
         try:
+            llm_usage_helper.set_current_stage(stage.name)
             start_time = time.time()
             args = copy.deepcopy(args)
 
@@ -120,33 +192,129 @@ def fold_pipeline(pipeline: list[PipelineStage], video):
                 break
             else:
                 continue
+    llm_usage_helper.set_current_stage(None)
     video_json = asdict(current_video)
     log_filename = generate_random_filename(
         "pipeline_state_" + video.__class__.__name__.lower(), "json"
     )
     with open(get_abs_path(log_filename), "w", encoding="utf-8") as f:
         json.dump(video_json, f, indent=4, ensure_ascii=False)
+    write_job_trace(current_video, log_filename)
     return current_video, log_filename
 
 
-def restart_stage(stage_name: str, pipeline, log_filename, class_instance):
-    abs_log_filename = get_abs_path(log_filename)
-    video_dict = json.load(open(abs_log_filename, encoding="utf-8"))
+def fold_pipeline_per_target(pipeline: list[PipelineStage], obj, fork_stage_name, targets):
+    """
+    Run stages shared by all translation targets once, then fork: the tail of the pipeline
+    starting at `fork_stage_name` runs concurrently for every target language,
+    with `translate_to` of each copy set to its target.
+
+    Returns:
+        list: (object, log_filename) for every target
+    """
+    if len(targets) <= 1:
+        obj.translate_to = targets[0] if targets else None
+        return [fold_pipeline(pipeline, obj)]
+    fork_index = next(i for i, stage in enumerate(pipeline) if stage.name == fork_stage_name)
+    shared_obj, _log_filename = fold_pipeline(pipeline[:fork_index], obj)
+    # services of the branches are started once around all of them: a service per branch
+    # would start a second container and move the port of the wrapper under the other branches
+    shared_resources = []
+    for stage in pipeline[fork_index:]:
+        for resource in stage.resources if stage.enabled else []:
+            if resource not in shared_resources:
+                shared_resources.append(resource)
+    branch_pipeline = [replace(stage, resources=[]) for stage in pipeline[fork_index:]]
+
+    def run_branch(target):
+        fork_job()
+        branch = copy.deepcopy(shared_obj)
+        branch.translate_to = target
+        print(f"Forking pipeline for {target}")
+        return fold_pipeline(branch_pipeline, branch, new_job=False)
+
+    with ExitStack() as stack:
+        for resource_def in shared_resources:
+            resource_def.setup(stack.enter_context(resource_def.factory()))
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            return list(executor.map(bind_context(run_branch), targets))
+
+
+def collect_outputs(objects, field_name):
+    """
+    One output filename, or a list of them for a job translated into several languages.
+    Targets whose pipeline failed are left out, None when none succeeded.
+    """
+    outputs = []
+    for obj in objects:
+        output = getattr(obj, field_name)
+        if output is None:
+            logger.error(
+                "no %s for target %s, its pipeline failed",
+                field_name,
+                getattr(obj, "translate_to", None),
+            )
+        else:
+            outputs.append(output)
+    if not outputs:
+        return None
+    return outputs[0] if len(objects) == 1 else outputs
+
+
+def write_job_trace(video, log_filename):
+    trace = {
+        "pipeline_state": log_filename,
+        "execution_times": getattr(video, "execution_times", {}),
+        "llm_usage": llm_usage_helper.summary(),
+        "llm_calls": llm_usage_helper.calls(),
+        "translation_memory": translation_memory_helper.stats(),
+        **_trace(),
+    }
+    trace_filename = log_filename.replace("pipeline_state_", "pipeline_trace_", 1)
+    with open(get_abs_path(trace_filename), "w", encoding="utf-8") as f:
+        json.dump(trace, f, indent=4, ensure_ascii=False, default=str)
+    llm_usage_helper.print_summary()
+    return trace_filename
 
-    start_idx = 0
-    for idx, stage in enumerate(pipeline):
-        if stage.name == stage_name:
-            start_idx = idx
-            break
-    tail_pipeline = pipeline[start_idx:]
 
-    for stage in tail_pipeline:
+def _stage_index(pipeline, stage_name):
+    return next((idx for idx, stage in enumerate(pipeline) if stage.name == stage_name), 0)
+
+
+def _load_for_restart(pipeline, log_filename, class_instance, start_idx):
+    abs_log_filename = get_abs_path(log_filename)
+    video_dict = json.load(open(abs_log_filename, encoding="utf-8"))
+    for stage in pipeline[start_idx:]:
         for output in stage.outputs:
             video_dict[output] = None
-    video = from_dict(data_class=class_instance, data=video_dict, config=Config(check_types=False))
+    return from_dict(data_class=class_instance, data=video_dict, config=Config(check_types=False))
+
+
+def restart_stage(stage_name: str, pipeline, log_filename, class_instance):
+    start_idx = _stage_index(pipeline, stage_name)
+    video = _load_for_restart(pipeline, log_filename, class_instance, start_idx)
     return fold_pipeline(pipeline, video)
 
 
+def restart_stage_per_target(
+    stage_name: str, pipeline, log_filename, class_instance, fork_stage_name, targets
+):
+    """
+    restart_stage for a job translated into several languages, forked as in
+    fold_pipeline_per_target. The saved state is the one of a single branch, its outputs
+    from the fork on are only reused when it was translated to the one requested target.
+
+    Returns:
+        list: (object, log_filename) for every target
+    """
+    start_idx = _stage_index(pipeline, stage_name)
+    saved = _load_for_restart(pipeline, log_filename, class_instance, start_idx)
+    if len(targets) > 1 or getattr(saved, "translate_to", None) != (targets or [None])[0]:
+        start_idx = min(start_idx, _stage_index(pipeline, fork_stage_name))
+        saved = _load_for_restart(pipeline, log_filename, class_instance, start_idx)
+    return fold_pipeline_per_target(pipeline, saved, fork_stage_name, targets)
+
+
 def get_last_pipeline_state(class_instance, query) -> str | None:
     prefix = "pipeline_state_" + class_instance.__name__.lower()
     files = [f for f in os.listdir("data") if f.startswith(prefix)]
@@ -72,9 +72,13 @@ def handle_text_message(text, entities_links=None):
     return file, error_message
 
 
-def copy_result_to_output(file):
+def copy_result_to_output(files):
+    """Copy a result file, or every file of a job translated into several languages."""
     os.makedirs(OUTPUT, exist_ok=True)
-    subprocess.run(["cp", get_abs_path(file), OUTPUT])
+    for file in files if isinstance(files, list) else [files]:
+        if file is None:
+            continue
+        subprocess.run(["cp", get_abs_path(file), OUTPUT])
 
 
 def handle_single_link(link):
@@ -2,6 +2,7 @@ import os
 from dataclasses import dataclass
 
 import src.config as config
+from src.helpers import hardware_profile_helper
 
 """
 config how to build and run containers
@@ -59,7 +60,7 @@ def get_containers_config(svc: str) -> DockerConfig:
 
     fasttext_config = DockerConfig(
         name="fasttext",
-        image_name=f"{PROJECT_PREFIX}/fasttext:1.0.0",
+        image_name=f"{PROJECT_PREFIX}/fasttext:1.0.1",
         volumes=[f"{DATA_DIR}:/data"],
     )
 
@@ -87,7 +88,7 @@ def get_containers_config(svc: str) -> DockerConfig:
 
     wespeaker_config = DockerConfig(
         name="wespeaker",
-        image_name=f"{PROJECT_PREFIX}/wespeaker:1.0.8",
+        image_name=f"{PROJECT_PREFIX}/wespeaker:1.0.9",
         use_gpu=True,
         volumes=[f"{DATA_DIR}:/data"],
         work_dir="/data",
@@ -100,6 +101,16 @@ def get_containers_config(svc: str) -> DockerConfig:
         use_gpu=True,
     )
 
+    whisperx_service_config = DockerConfig(
+        name="whisperx_service",
+        port_container=8400,
+        port_host=8400,
+        ping_path="/ping",
+        image_name=f"{PROJECT_PREFIX}/whisperx_service:1.0.0",
+        volumes=[f"{DATA_DIR}:/data", f"{MODELS_DIR}:/models"],
+        use_gpu=True,
+    )
+
     yt_dlp_config = DockerConfig(
         name="yt_dlp",
         image_name=f"{PROJECT_PREFIX}/yt_dlp:1.0.0",
@@ -114,7 +125,10 @@ def get_containers_config(svc: str) -> DockerConfig:
         use_gpu=True,
         volumes=[f"{OLLAMA_MODELS_DIR}:/root/.ollama/models"],
         ping_path="/api/tags",
-        env_vars={"OLLAMA_FLASH_ATTENTION": "1"},
+        env_vars={
+            "OLLAMA_FLASH_ATTENTION": "1",
+            "OLLAMA_NUM_PARALLEL": str(hardware_profile_helper.get_profile().llm_parallel),
+        },
     )
 
     readability_config = DockerConfig(
@@ -131,6 +145,8 @@ def get_containers_config(svc: str) -> DockerConfig:
         port_host=8011,
         ping_path="/",
         image_name=f"{PROJECT_PREFIX}/languagetool:1.0.0",
+        # written to the server config.properties, language_tool_wrapper sends as many requests
+        env_vars={"langtool_maxCheckThreads": "10"},
     )
 
     tiktoken_config = DockerConfig(
@@ -159,6 +175,7 @@ def get_containers_config(svc: str) -> DockerConfig:
         "pymorphy3": pymorphy3_config,
         "wespeaker": wespeaker_config,
         "whisperx": whisperx_config,
+        "whisperx_service": whisperx_service_config,
         "yt_dlp": yt_dlp_config,
         "ollama": ollama_config,
         "readability": readability_config,
@@ -68,6 +68,8 @@ class ManagedDockerService:
         run_config = {}
         run_config["ports"] = {self.config.port_container: self.config.port_host}
         run_config["detach"] = True
+        if self.config.env_vars:
+            run_config["environment"] = self.config.env_vars
         if self.config.volumes:
             run_config["volumes"] = (
                 self.config.volumes
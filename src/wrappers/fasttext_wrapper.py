@@ -48,6 +48,30 @@ def detect_language(text: str) -> str | None:
     return _run_fasttext_container(text)
 
 
+def detect_languages(texts: list[str]) -> list[str | None]:
+    """
+    Language of every text with a single container run, None where it is not detected
+    (texts of 20 characters or less are not).
+    """
+    if not texts:
+        return []
+    payload_file = f"texts_to_detect_{uuid.uuid4()}.json"
+    with open(get_abs_path(payload_file), "w", encoding="utf-8") as f:
+        json.dump(texts, f, ensure_ascii=False)
+    output_file = f"fasttext_langid_output_{uuid.uuid4()}.json"
+    command = ["/data/" + payload_file, "/data/" + output_file]
+    proc = docker_wrapper.run_docker_container("fasttext", command)
+    try:
+        with open(get_abs_path(output_file), encoding="utf-8") as f:
+            languages = json.load(f)["languages"]
+    except Exception:
+        logger.error(
+            "fasttext_langid container failed.\nSTDOUT:\n%s\nSTDERR:\n%s", proc.stdout, proc.stderr
+        )
+        return [None] * len(texts)
+    return languages
+
+
 if __name__ == "__main__":
     print(
         detect_language(
@@ -1,60 +1,211 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+
+from src.helpers.filepath_helper import generate_random_filename, get_abs_path, get_rel_path
 from src.wrappers import docker_wrapper
 
+FRAME_INTERVAL_SECONDS = 4  # at most one screenshot per interval
+FINGERPRINT_CHUNK = 1024 * 1024
+ASR_SAMPLE_RATE = 16000
+# 16 kHz mono 16-bit PCM: what whisperx and wespeaker resample everything to anyway
+ASR_AUDIO_ARGS = ["-vn", "-ac", "1", "-ar", str(ASR_SAMPLE_RATE), "-c:a", "pcm_s16le"]
+SHOWINFO_PTS_TIME = re.compile(r"Parsed_showinfo.*?\bn:\s*(\d+).*?\bpts_time:\s*([-\d.]+)")
+
 
 def _run_in_ffmpeg_container(cmd_args, check=False, text=True, capture_output=True):
     command = [" ".join(cmd_args)]
     return docker_wrapper.run_docker_container("ffmpeg", command, capture_output=True)
 
 
-def _probe_duration_seconds(path: str) -> int:
+@dataclass
+class StreamInfo:
+    index: int
+    codec_type: str  # audio | video | subtitle | data
+    codec_name: str | None = None
+    duration: float | None = None
+    sample_rate: int | None = None
+    channels: int | None = None
+    width: int | None = None
+    height: int | None = None
+
+
+@dataclass
+class MediaInfo:
+    duration: float | None
+    format_name: str | None = None
+    bit_rate: int | None = None
+    streams: list[StreamInfo] = field(default_factory=list)
+
+    @property
+    def audio_streams(self) -> list[StreamInfo]:
+        return [stream for stream in self.streams if stream.codec_type == "audio"]
+
+    @property
+    def video_streams(self) -> list[StreamInfo]:
+        return [stream for stream in self.streams if stream.codec_type == "video"]
+
+    @property
+    def audio_codec(self) -> str | None:
+        return self.audio_streams[0].codec_name if self.audio_streams else None
+
+
+_probe_cache: dict[str, MediaInfo] = {}
+_probe_lock = threading.Lock()
+
+
+def _number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def file_fingerprint(path: str) -> str:
+    """Content hash of size, head and tail of the file, cheap even for long videos."""
+    abs_path = get_abs_path(path)
+    size = os.path.getsize(abs_path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(abs_path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_CHUNK))
+        if size > FINGERPRINT_CHUNK:
+            f.seek(max(size - FINGERPRINT_CHUNK, FINGERPRINT_CHUNK))
+            digest.update(f.read(FINGERPRINT_CHUNK))
+    return digest.hexdigest()
+
+
+def probe_media(path: str) -> MediaInfo:
+    """
+    Duration, container and streams of a media file (path relative to data/),
+    from one `ffprobe -print_format json` run, cached per file content.
+    Raises ValueError if the file can not be probed.
+    """
+    fingerprint = file_fingerprint(path)
+    with _probe_lock:
+        if fingerprint in _probe_cache:
+            return _probe_cache[fingerprint]
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-print_format",
+        "json",
+        "-show_format",
+        "-show_streams",
+        path,
+    ]
+    res = _run_in_ffmpeg_container(command, text=True, capture_output=True)
+    try:
+        data = json.loads(res.stdout or "")
+    except ValueError as e:
+        raise ValueError(f"ffprobe failed for {path}: {res.stderr}") from e
+    format_dict = data.get("format") or {}
+    streams = [
+        StreamInfo(
+            index=stream.get("index", i),
+            codec_type=stream.get("codec_type", ""),
+            codec_name=(stream.get("codec_name") or "").lower() or None,
+            duration=_number(stream.get("duration")),
+            sample_rate=_number(stream.get("sample_rate"), int),
+            channels=stream.get("channels"),
+            width=stream.get("width"),
+            height=stream.get("height"),
+        )
+        for i, stream in enumerate(data.get("streams") or [])
+    ]
+    duration = _number(format_dict.get("duration"))
+    if duration is None:
+        duration = max([stream.duration for stream in streams if stream.duration] or [0]) or None
+    if duration is None:
+        raise ValueError(f"Unable to determine duration of {path}")
+    info = MediaInfo(
+        duration=duration,
+        format_name=format_dict.get("format_name"),
+        bit_rate=_number(format_dict.get("bit_rate"), int),
+        streams=streams,
+    )
+    with _probe_lock:
+        _probe_cache[fingerprint] = info
+    return info
+
+
+def is_asr_audio(info: MediaInfo) -> bool:
+    streams = info.audio_streams
+    return (
+        len(streams) == 1
+        and streams[0].codec_name == "pcm_s16le"
+        and streams[0].sample_rate == ASR_SAMPLE_RATE
+        and streams[0].channels == 1
+    )
+
+
+def normalize_audio(audio_path):
     """
-    Robustly probe media duration in seconds using Dockerized tools.
-    Prefer parsing the Duration banner from ffmpeg (widely compatible),
-    with ffprobe banner as a secondary fallback. Returns floor(seconds) as int.
-    Raises ValueError if duration cannot be determined.
+    Decode the first audio track once into a 16 kHz mono PCM wav in data/,
+    the single input of diarization and transcription. Already normalised wavs are reused.
     """
-    # 1) Try ffmpeg banner (most compatible across images)
-    ffmpeg_banner_cmd = ["ffmpeg", "-i", path]
-    res = _run_in_ffmpeg_container(ffmpeg_banner_cmd, text=True, capture_output=True)
-    err = res.stderr or ""
-    # Parse Duration: HH:MM:SS.xx
-    import re
-
-    m = re.search(r"Duration:\s*(\d+):(\d+):(\d+)(?:[\.,](\d+))?", err)
-    if m:
-        h, mnt, s, frac = m.groups()
-        total = int(h) * 3600 + int(mnt) * 60 + int(s)
-        return int(total)
-
-    # 2) Fallback: ffprobe banner without flags (some builds lack show_entries/select_streams)
-    banner_cmd = ["ffprobe", path]
-    res = _run_in_ffmpeg_container(banner_cmd, text=True, capture_output=True)
-    err = res.stderr or ""
-    m = re.search(r"Duration:\s*(\d+):(\d+):(\d+)(?:[\.,](\d+))?", err)
-    if m:
-        h, mnt, s, frac = m.groups()
-        total = int(h) * 3600 + int(mnt) * 60 + int(s)
-        return int(total)
-
-    raise ValueError("Unable to determine duration via ffmpeg/ffprobe banners")
-
-
-def _probe_audio_codec(path: str):
+    audio_path = get_rel_path(audio_path)
+    if audio_path.endswith(".wav") and is_asr_audio(probe_media(audio_path)):
+        return audio_path
+    output_file = generate_random_filename("audio_16k", "wav")
+    command = ["ffmpeg", "-y", "-i", audio_path, "-map", "0:a:0"] + ASR_AUDIO_ARGS + [output_file]
+    result = _run_in_ffmpeg_container(command, text=True, capture_output=True)
+    if not os.path.isfile(get_abs_path(output_file)):
+        raise RuntimeError(f"ffmpeg failed to decode {audio_path}: {(result.stderr or '')[-2000:]}")
+    return output_file
+
+
+def extract_audio_and_frames(
+    video_path, audio_file, audio_codec_args, images_dir, interval=FRAME_INTERVAL_SECONDS
+):
     """
-    Determine audio codec by parsing ffmpeg/ffprobe banners inside Docker.
-    Returns codec name in lowercase, or None if not found.
+    One ffmpeg pass: demux (or transcode) the audio track into `audio_file` and save a frame
+    every `interval` seconds into `images_dir` (%04d.jpg). Only keyframes are decoded,
+    the first keyframe of each interval is kept.
+    Presentation timestamps of saved frames are written to `images_dir + ".json"`
+    as {"0001.jpg": seconds, ...}.
     """
-    res = _run_in_ffmpeg_container(["ffmpeg", "-i", path], text=True, capture_output=True)
-    err = res.stderr or ""
-    import re
-
-    m = re.search(r"Audio:\s*([A-Za-z0-9_]+)", err)
-    if m:
-        return m.group(1).lower()
-    # Fallback to ffprobe banner parsing
-    res = _run_in_ffmpeg_container(["ffprobe", path], text=True, capture_output=True)
-    err = res.stderr or ""
-    m = re.search(r"Audio:\s*([A-Za-z0-9_]+)", err)
-    if m:
-        return m.group(1).lower()
-    return None
+    frame_filter = f"select=isnan(prev_selected_t)+gte(t-prev_selected_t\\,{interval}),showinfo"
+    command = [
+        "ffmpeg",
+        "-y",
+        "-skip_frame",
+        "nokey",
+        "-i",
+        video_path,
+        "-map",
+        "0:a:0",
+    ]
+    command += audio_codec_args + [audio_file]
+    command += [
+        "-map",
+        "0:v:0",
+        "-vf",
+        f'"{frame_filter}"',
+        "-vsync",
+        "vfr",
+        "-q:v",
+        "2",
+        f"{images_dir}/%04d.jpg",
+    ]
+    result = _run_in_ffmpeg_container(command, text=True, capture_output=True)
+    timestamps = {}
+    for line in (result.stderr or "").splitlines():
+        match = SHOWINFO_PTS_TIME.search(line)
+        if match:
+            timestamps[f"{int(match.group(1)) + 1:04d}.jpg"] = max(float(match.group(2)), 0.0)
+    with open(get_abs_path(images_dir + ".json"), "w", encoding="utf-8") as f:
+        json.dump(timestamps, f, indent=1)
+    return result, timestamps
+
+
+def load_frame_timestamps(images_dir):
+    """Timestamps written by extract_audio_and_frames, None for frames extracted otherwise."""
+    try:
+        with open(get_abs_path(images_dir + ".json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -1,12 +1,52 @@
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Any
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.wrappers import docker_config_wrapper
 
 PORT = 8010
 logger = logging.getLogger(__name__)
 
+# maxCheckThreads of a languagetool server started without it
+DEFAULT_SERVER_CHECK_THREADS = 10
+TIMEOUT = (5, 180)  # connect, read seconds
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _check_workers():
+    """
+    Texts checked at once: the maxCheckThreads the languagetool container is configured with,
+    more concurrent requests would only queue on the server.
+    """
+    env_vars = docker_config_wrapper.get_containers_config("languagetool").env_vars or {}
+    return int(env_vars.get("langtool_maxCheckThreads", DEFAULT_SERVER_CHECK_THREADS))
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["POST"],
+            )
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=_check_workers(), max_retries=retry
+            )
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+        return _session
+
 
 def set_language_tool_port(language_tool_port):
     global PORT
@@ -50,9 +90,11 @@ def check_text_with_language_tool(text, language):
     headers = {"Content-Type": "application/x-www-form-urlencoded", "Accept": "application/json"}
     data = {"text": text, "language": language, "enabledOnly": "false"}
     logger.debug("languagetool: %s", data)
-    response = requests.post(url, headers=headers, data=data)
+    # connection errors and 429/5xx are retried by the session, then raised:
+    # an unchecked text must not pass for a text without errors
+    response = _get_session().post(url, headers=headers, data=data, timeout=TIMEOUT)
+    response.raise_for_status()
     try:
-        response_dict = response.json()
         return response.json()
     except Exception:
         logger.debug("languagetool error: %s", response.text)
@@ -122,6 +164,37 @@ def apply_and_count_errors_for_text(b, language):
     return err_messages, errors_tuples
 
 
+def _to_structured_response(response_dict):
+    # Convert matches to structured objects
+    matches = []
+    for match_dict in response_dict.get("matches", []):
+        rule_dict = match_dict["rule"]
+        matches.append(
+            Match(
+                offset=match_dict["offset"],
+                length=match_dict["length"],
+                message=match_dict["message"],
+                rule=Rule(
+                    id=rule_dict["id"],
+                    description=rule_dict.get("description"),
+                    issueType=rule_dict.get("issueType"),
+                    category=rule_dict.get("category"),
+                ),
+                replacements=[
+                    Replacement(value=r["value"]) for r in match_dict.get("replacements", [])
+                ],
+                context=match_dict.get("context"),
+                sentence=match_dict.get("sentence"),
+            )
+        )
+    return LanguageToolResponse(
+        matches=matches,
+        software=response_dict.get("software"),
+        language=response_dict.get("language"),
+        warnings=response_dict.get("warnings"),
+    )
+
+
 def check_text_with_language_tool_structured(text, language):
     """
     Check text with LanguageTool and return a structured LanguageToolResponse object.
@@ -133,40 +206,22 @@ def check_text_with_language_tool_structured(text, language):
     Returns:
         LanguageToolResponse: A structured response object
     """
-    # Use the existing function to get the JSON response
-    response_dict = check_text_with_language_tool(text, language)
+    return _to_structured_response(check_text_with_language_tool(text, language))
 
-    # Convert matches to structured objects
-    matches = []
-    for match_dict in response_dict.get("matches", []):
-        # Create Rule object
-        rule = Rule(
-            id=match_dict["rule"]["id"],
-            description=match_dict["rule"].get("description"),
-            issueType=match_dict["rule"].get("issueType"),
-            category=match_dict["rule"].get("category"),
-        )
 
-        # Create Replacement objects
-        replacements = [Replacement(value=r["value"]) for r in match_dict.get("replacements", [])]
-
-        # Create Match object
-        match = Match(
-            offset=match_dict["offset"],
-            length=match_dict["length"],
-            message=match_dict["message"],
-            rule=rule,
-            replacements=replacements,
-            context=match_dict.get("context"),
-            sentence=match_dict.get("sentence"),
-        )
-
-        matches.append(match)
+def check_texts_with_language_tool_structured(texts, language):
+    """
+    Check many texts concurrently, as many requests in flight as the server has check threads.
 
-    # Create and return LanguageToolResponse object
-    return LanguageToolResponse(
-        matches=matches,
-        software=response_dict.get("software"),
-        language=response_dict.get("language"),
-        warnings=response_dict.get("warnings"),
-    )
+    Returns:
+        list[LanguageToolResponse]: responses in the order of texts
+    """
+    texts = list(texts)
+    if len(texts) <= 1:
+        return [check_text_with_language_tool_structured(text, language) for text in texts]
+    with ThreadPoolExecutor(max_workers=min(_check_workers(), len(texts))) as executor:
+        return list(
+            executor.map(
+                lambda text: check_text_with_language_tool_structured(text, language), texts
+            )
+        )
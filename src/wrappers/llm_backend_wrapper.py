@@ -0,0 +1,210 @@
+"""
+LLM backends used by ollama_wrapper._call_ollama_chat.
+Each backend sends one chat request to one endpoint url and returns content plus usage
+in the units of llm_usage_helper.record_call.
+"""
+
+import base64
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Protocol
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+ABORT_CHECK_EVERY = 16  # streamed chunks between two abort_check calls
+
+
+class DegenerateOutputError(Exception):
+    """Generation was aborted because the model got stuck in a loop."""
+
+    def __init__(self, partial_text):
+        super().__init__("model output degenerated into a loop")
+        self.partial_text = partial_text
+
+
+@dataclass
+class ChatResult:
+    content: str
+    usage: dict = field(default_factory=dict)
+
+
+class LLMBackend(Protocol):
+    """What ollama_wrapper._call_ollama_chat needs from a backend (OllamaBackend lives there)."""
+
+    name: str
+    health_path: str  # GET on this path tells the balancer the endpoint is up
+
+    def ensure_model(self, url, model) -> None: ...
+
+    def chat(
+        self,
+        url,
+        model,
+        prompt,
+        images=None,
+        options=None,
+        think=None,
+        keep_alive=None,
+        format=None,
+        abort_check=None,
+    ) -> ChatResult: ...
+
+
+def strict_schema(schema):
+    """
+    Copy of a json schema accepted by strict structured output: every object lists all its
+    properties as required and allows no others.
+    """
+    if isinstance(schema, list):
+        return [strict_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    result = {key: strict_schema(value) for key, value in schema.items()}
+    if isinstance(schema.get("properties"), dict):
+        result["properties"] = {
+            name: strict_schema(value) for name, value in schema["properties"].items()
+        }
+        result["required"] = list(schema["properties"])
+        result["additionalProperties"] = False
+    return result
+
+
+# ollama option name -> openai-compatible request field
+OPENAI_OPTION_NAMES = {
+    "temperature": "temperature",
+    "top_p": "top_p",
+    "top_k": "top_k",
+    "repeat_penalty": "repeat_penalty",
+    "repetition_penalty": "repeat_penalty",
+    "num_predict": "max_tokens",
+}
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Backend for llama.cpp server, vLLM and other servers implementing /v1/chat/completions.
+    Such servers batch concurrent requests across their parallel slots, so the endpoint
+    max_concurrency should match the number of slots (e.g. llama-server -np).
+    """
+
+    name = "openai"
+    health_path = "/v1/models"
+
+    def __init__(self, api_key=None, model_aliases=None, timeout=600):
+        self.api_key = api_key
+        self.model_aliases = dict(model_aliases or {})
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def ensure_model(self, url, model):
+        # models are loaded by the server itself
+        pass
+
+    def _payload(self, model, prompt, images, options, think, format):
+        if images:
+            content = [{"type": "text", "text": prompt}] + [
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": "data:image/jpeg;base64," + base64.b64encode(image).decode("ascii")
+                    },
+                }
+                for image in images
+            ]
+        else:
+            content = prompt
+        payload = {
+            "model": self.model_aliases.get(model, model),
+            "messages": [{"role": "user", "content": content}],
+        }
+        for option, value in options.items():
+            if option in OPENAI_OPTION_NAMES:
+                payload[OPENAI_OPTION_NAMES[option]] = value
+        if format:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "response",
+                    "schema": strict_schema(format),
+                    "strict": True,
+                },
+            }
+        if think is not None:
+            payload["chat_template_kwargs"] = {"enable_thinking": bool(think)}
+        return payload
+
+    def _post(self, url, payload, stream):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        try:
+            response = self.session.post(
+                f"{url}/v1/chat/completions",
+                json=payload,
+                headers=headers,
+                timeout=self.timeout,
+                stream=stream,
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise ConnectionError(str(e)) from e
+        response.raise_for_status()
+        return response
+
+    @staticmethod
+    def _usage(data, start_time):
+        usage = data.get("usage") or {}
+        timings = data.get("timings") or {}  # llama.cpp server extension
+        return {
+            "prompt_tokens": timings.get("prompt_n", usage.get("prompt_tokens")),
+            "prompt_eval_seconds": (timings.get("prompt_ms") or 0) / 1000,
+            "eval_tokens": timings.get("predicted_n", usage.get("completion_tokens")),
+            "eval_seconds": (timings.get("predicted_ms") or 0) / 1000,
+            "total_seconds": time.time() - start_time,
+        }
+
+    def chat(
+        self,
+        url,
+        model,
+        prompt,
+        images=None,
+        options=None,
+        think=None,
+        keep_alive=None,
+        format=None,
+        abort_check=None,
+    ) -> ChatResult:
+        start_time = time.time()
+        payload = self._payload(model, prompt, images, options or {}, think, format)
+        if abort_check is None:
+            data = self._post(url, payload, stream=False).json()
+            content = data["choices"][0]["message"]["content"] or ""
+            return ChatResult(content, self._usage(data, start_time))
+
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+        response = self._post(url, payload, stream=True)
+        content = ""
+        last_data = {}
+        try:
+            for i, line in enumerate(response.iter_lines(decode_unicode=True)):
+                if not line or not line.startswith("data:"):
+                    continue
+                chunk = line[len("data:") :].strip()
+                if chunk == "[DONE]":
+                    break
+                last_data = json.loads(chunk)
+                for choice in last_data.get("choices") or []:
+                    content += (choice.get("delta") or {}).get("content") or ""
+                if i % ABORT_CHECK_EVERY == 0 and abort_check(content):
+                    logger.debug("aborting generation after %s chunks", i + 1)
+                    raise DegenerateOutputError(content)
+        finally:
+            # closing the connection makes the server cancel the generation
+            response.close()
+        return ChatResult(content, self._usage(last_data, start_time))
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL = 30  # seconds before a failed endpoint is probed again
+HEALTH_CHECK_TIMEOUT = 3
+
+
+@dataclass
+class Endpoint:
+    url: str
+    weight: float = 1.0
+    models: list[str] = field(default_factory=list)
+    max_concurrency: int = 2
+    in_flight: int = 0
+    healthy: bool = True
+    failed_at: float = 0.0
+
+    def has_affinity(self, model):
+        return model in self.models
+
+    def serves(self, model):
+        return not self.models or model in self.models
+
+    def load(self):
+        return (self.in_flight + 1) / max(self.weight, 1e-6)
+
+
+class OllamaBalancer:
+    """
+    Client-side balancer over several Ollama endpoints.
+
+    - endpoints listing the requested model are preferred, endpoints without a model list
+      serve any model, endpoints listing only other models are used as a last resort
+    - each endpoint accepts at most `max_concurrency` requests, callers block until a slot frees up
+    - among free endpoints the one with the lowest in_flight / weight is picked
+    - failed endpoints are skipped, and probed via health_path in the background
+      at most once per HEALTH_CHECK_INTERVAL seconds
+    """
+
+    def __init__(self, endpoints: list[Endpoint], health_path="/api/tags"):
+        self.endpoints = endpoints
+        self.health_path = health_path
+        self._condition = threading.Condition()
+
+    @property
+    def total_concurrency(self):
+        return sum(max(endpoint.max_concurrency, 1) for endpoint in self.endpoints)
+
+    def _candidates(self, model, exclude):
+        endpoints = [endpoint for endpoint in self.endpoints if endpoint.url not in exclude]
+        serving = [endpoint for endpoint in endpoints if endpoint.serves(model)]
+        candidates = serving or endpoints
+        healthy = [endpoint for endpoint in candidates if endpoint.healthy]
+        # if every candidate failed recently, try them anyway instead of failing outright
+        return healthy or candidates
+
+    def _probe(self, endpoint: Endpoint):
+        try:
+            response = requests.get(
+                f"{endpoint.url}{self.health_path}", timeout=HEALTH_CHECK_TIMEOUT
+            )
+            response.raise_for_status()
+        except Exception as e:
+            logger.debug("ollama endpoint %s is still unavailable: %s", endpoint.url, e)
+            return
+        with self._condition:
+            endpoint.healthy = True
+            self._condition.notify_all()
+        logger.info("ollama endpoint %s is back online", endpoint.url)
+
+    def _revive(self):
+        """Probe failed endpoints in the background, each at most once per HEALTH_CHECK_INTERVAL."""
+        now = time.time()
+        with self._condition:
+            due = [
+                endpoint
+                for endpoint in self.endpoints
+                if not endpoint.healthy and now - endpoint.failed_at >= HEALTH_CHECK_INTERVAL
+            ]
+            for endpoint in due:
+                # the next probe is due one interval after this one
+                endpoint.failed_at = now
+        for endpoint in due:
+            threading.Thread(target=self._probe, args=(endpoint,), daemon=True).start()
+
+    def acquire(self, model, exclude=()) -> Endpoint:
+        self._revive()
+        with self._condition:
+            while True:
+                candidates = self._candidates(model, exclude)
+                if not candidates:
+                    raise ConnectionError(f"no ollama endpoint left to serve {model}")
+                free = [e for e in candidates if e.in_flight < max(e.max_concurrency, 1)]
+                if free:
+                    endpoint = min(free, key=lambda e: (not e.has_affinity(model), e.load()))
+                    endpoint.in_flight += 1
+                    return endpoint
+                self._condition.wait()
+
+    def release(self, endpoint: Endpoint):
+        with self._condition:
+            endpoint.in_flight -= 1
+            self._condition.notify_all()
+
+    def mark_unhealthy(self, endpoint: Endpoint):
+        with self._condition:
+            endpoint.healthy = False
+            endpoint.failed_at = time.time()
+            self._condition.notify_all()
+        logger.warning("ollama endpoint %s marked as unhealthy", endpoint.url)
+
+    @contextmanager
+    def endpoint(self, model, exclude=()):
+        endpoint = self.acquire(model, exclude)
+        try:
+            yield endpoint
+        finally:
+            self.release(endpoint)
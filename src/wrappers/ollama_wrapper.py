@@ -1,12 +1,34 @@
 import json
 import logging
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import httpx
 import ollama
 import src.config as config
 from pydantic import BaseModel
 from tqdm import tqdm
 
+from src import pipeline
+from src.helpers import (
+    hardware_profile_helper,
+    html_evidence_helper,
+    llm_usage_helper,
+    text_helper,
+    translation_memory_helper,
+)
+from src.wrappers import pillow_wrapper
+from src.wrappers.llm_backend_wrapper import (
+    ABORT_CHECK_EVERY,
+    ChatResult,
+    DegenerateOutputError,
+    LLMBackend,
+    OpenAICompatibleBackend,
+)
+from src.wrappers.ollama_balancer import Endpoint, OllamaBalancer
+
 logger = logging.getLogger(__name__)
 
 
@@ -39,16 +61,96 @@ REQUIRED_MODELS = {
 }
 
 
+# longest image side (px) each vision model works with, larger images are downscaled before upload
+VISION_MODEL_IMAGE_SIDES = {
+    "deepseek-ocr:latest": 1280,
+    "ministral-3:8b": 1024,
+    "ministral-3:3b": 1024,
+}
+DEFAULT_IMAGE_SIDE = 1536
+
+
+def _llm_model():
+    return hardware_profile_helper.get_profile().llm_model
+
+
 def set_ollama_port(port):
     global OLLAMA_PORT
     OLLAMA_PORT = port
 
 
-def get_ollama_base():
+def get_ollama_endpoints() -> list[Endpoint]:
     cfg = config.get_config()
+    if cfg and cfg.ollama_endpoints:
+        return [
+            Endpoint(
+                url=endpoint.url.rstrip("/"),
+                weight=endpoint.weight,
+                models=list(endpoint.models),
+                max_concurrency=endpoint.max_concurrency,
+            )
+            for endpoint in cfg.ollama_endpoints
+        ]
     if cfg and cfg.ollama_url:
-        return cfg.ollama_url
-    return f"http://localhost:{OLLAMA_PORT}"
+        urls = [url.strip().rstrip("/") for url in cfg.ollama_url.split(",") if url.strip()]
+        return [Endpoint(url=url) for url in urls]
+    return [
+        Endpoint(
+            url=f"http://localhost:{OLLAMA_PORT}",
+            max_concurrency=hardware_profile_helper.get_profile().llm_parallel,
+        )
+    ]
+
+
+_balancer = None
+_balancer_key = None
+_balancer_lock = threading.Lock()
+_backends = {}
+
+
+def get_backend() -> LLMBackend:
+    """Backend selected by config.llm_backend: ollama (default) or openai-compatible server."""
+    cfg = config.get_config()
+    backend_name = (cfg.llm_backend if cfg else None) or "ollama"
+    with _balancer_lock:
+        if backend_name not in _backends:
+            if backend_name == "ollama":
+                _backends[backend_name] = OllamaBackend()
+            elif backend_name == "openai":
+                _backends[backend_name] = OpenAICompatibleBackend(
+                    api_key=cfg.llm_api_key, model_aliases=cfg.llm_model_aliases
+                )
+            else:
+                raise ValueError(f"unknown llm_backend {backend_name}, expected ollama or openai")
+        return _backends[backend_name]
+
+
+def get_balancer() -> OllamaBalancer:
+    """Balancer over configured endpoints, rebuilt when the endpoint list changes (new port...)."""
+    global _balancer, _balancer_key
+    endpoints = get_ollama_endpoints()
+    health_path = get_backend().health_path
+    key = (tuple(endpoint.url for endpoint in endpoints), health_path)
+    with _balancer_lock:
+        if _balancer is None or key != _balancer_key:
+            _balancer = OllamaBalancer(endpoints, health_path=health_path)
+            _balancer_key = key
+        return _balancer
+
+
+def parallel_map(func, items, desc=None):
+    """
+    Apply `func` to every item concurrently, keeping the order of results.
+    Number of workers matches the total concurrency of configured ollama endpoints,
+    so the balancer never has to queue more requests than endpoints can serve.
+    """
+    items = list(items)
+    if not items:
+        return []
+    max_workers = min(get_balancer().total_concurrency, len(items))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(pipeline.bind_context(func), items)
+        return list(tqdm(results, total=len(items), desc=desc, disable=desc is None))
 
 
 def _create_model(client, model_name, from_model, template):
@@ -93,9 +195,12 @@ def _call_ollama_chat(
     images=None,
     think=None,
     format=None,
+    abort_check=None,
+    call_site=None,
 ):
     """
-    Helper method to handle common functionality for ollama.chat calls.
+    Helper method to handle common functionality for chat calls.
+    Requests go through the configured backend (config.llm_backend) to a balanced endpoint.
 
     Args:
         prompt (str): The prompt to send to the model
@@ -104,48 +209,162 @@ def _call_ollama_chat(
         max_tokens (int, optional): Maximum tokens to generate. Defaults to 4096.
         num_predict (int, optional): Number of tokens to predict. Defaults to 4096.
         keep_alive (int, optional): Keep alive parameter. Defaults to 10.
-        images (list, optional): List of image paths to include. Defaults to None.
+        images (list, optional): List of image paths to include, downscaled to the model
+            input resolution before upload. Defaults to None.
+        abort_check (callable, optional): If given, the response is streamed and generation
+            is aborted with DegenerateOutputError as soon as abort_check(text_so_far) is True.
+        call_site (str, optional): Name the call is accounted under in llm usage statistics.
 
     Returns:
         str: The content of the model's response
     """
-
     if model is None:
-        model_name = "ministral-3:8b"
+        model_name = _llm_model()
     else:
         model_name = model
 
-    message = {"role": "user", "content": prompt}
     if images:
-        message["images"] = images
+        max_side = VISION_MODEL_IMAGE_SIDES.get(model_name, DEFAULT_IMAGE_SIDE)
+        images = [pillow_wrapper.prepare_image_for_model(image, max_side) for image in images]
 
     options = {"temperature": temperature, "max_tokens": max_tokens, "num_predict": num_predict}
     if model_name in REQUIRED_MODELS:
         options.update(REQUIRED_MODELS[model_name].get("options", {}))
 
-    client = ollama.Client(host=get_ollama_base())
-    if model_name not in list(map(lambda x: x.model, client.list().models)):
-        if model_name in REQUIRED_MODELS:
-            _create_model(
-                client,
-                model_name,
-                REQUIRED_MODELS[model_name]["from"],
-                REQUIRED_MODELS[model_name]["template"],
-            )
+    backend = get_backend()
+    balancer = get_balancer()
+    tried = []
+    while True:
+        with balancer.endpoint(model_name, exclude=tried) as endpoint:
+            try:
+                backend.ensure_model(endpoint.url, model_name)
+                start_time = time.time()
+                try:
+                    result = backend.chat(
+                        endpoint.url,
+                        model_name,
+                        prompt,
+                        images=images,
+                        options=options,
+                        think=think,
+                        keep_alive=keep_alive,
+                        format=format,
+                        abort_check=abort_check,
+                    )
+                except DegenerateOutputError:
+                    llm_usage_helper.record_call(
+                        call_site,
+                        model_name,
+                        total_seconds=time.time() - start_time,
+                        endpoint=endpoint.url,
+                    )
+                    raise
+                llm_usage_helper.record_call(
+                    call_site, model_name, endpoint=endpoint.url, **result.usage
+                )
+                return result.content
+            except (ConnectionError, httpx.TransportError) as e:
+                balancer.mark_unhealthy(endpoint)
+                tried.append(endpoint.url)
+                if len(tried) >= len(balancer.endpoints):
+                    raise
+                logger.warning("llm endpoint %s failed (%s), failing over", endpoint.url, e)
+
+
+class OllamaBackend(LLMBackend):
+    name = "ollama"
+    health_path = "/api/tags"
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _client(self, url):
+        with self._lock:
+            if url not in self._clients:
+                self._clients[url] = ollama.Client(host=url)
+            return self._clients[url]
+
+    def ensure_model(self, url, model):
+        _ensure_model(self._client(url), model)
+
+    def chat(
+        self,
+        url,
+        model,
+        prompt,
+        images=None,
+        options=None,
+        think=None,
+        keep_alive=None,
+        format=None,
+        abort_check=None,
+    ) -> ChatResult:
+        start_time = time.time()
+        message = {"role": "user", "content": prompt}
+        if images:
+            message["images"] = images
+        chat_kwargs = dict(
+            model=model,
+            messages=[message],
+            options=options,
+            think=think,
+            keep_alive=keep_alive,
+            format=format,
+        )
+        client = self._client(url)
+        if abort_check is None:
+            json_res = client.chat(**chat_kwargs)
+            content = json_res["message"]["content"]
         else:
-            logger.debug("model %s not found, downloading...", model_name)
-            _load_model(client, model_name)
-
-    json_res = client.chat(
-        model=model_name,
-        messages=[message],
-        options=options,
-        think=think,
-        keep_alive=keep_alive,
-        format=format,
-    )
+            json_res, content = _stream_chat(client, abort_check, chat_kwargs)
+        return ChatResult(content, _ollama_usage(json_res, start_time))
+
 
-    return json_res["message"]["content"]
+def _stream_chat(client, abort_check, chat_kwargs):
+    stream = client.chat(stream=True, **chat_kwargs)
+    content = ""
+    last_chunk = {}
+    try:
+        for i, chunk in enumerate(stream):
+            content += chunk["message"]["content"]
+            last_chunk = chunk
+            if i % ABORT_CHECK_EVERY == 0 and abort_check(content):
+                logger.debug("aborting generation after %s chunks", i + 1)
+                raise DegenerateOutputError(content)
+    finally:
+        # closing the stream drops the connection, ollama stops generating
+        stream.close()
+    return last_chunk, content
+
+
+def _ollama_usage(json_res, start_time):
+    def seconds(key):
+        return (json_res.get(key) or 0) / 1e9
+
+    return {
+        "prompt_tokens": json_res.get("prompt_eval_count"),
+        "prompt_eval_seconds": seconds("prompt_eval_duration"),
+        "eval_tokens": json_res.get("eval_count"),
+        "eval_seconds": seconds("eval_duration"),
+        "load_seconds": seconds("load_duration"),
+        "total_seconds": seconds("total_duration") or time.time() - start_time,
+    }
+
+
+def _ensure_model(client, model_name):
+    if model_name in list(map(lambda x: x.model, client.list().models)):
+        return
+    if model_name in REQUIRED_MODELS:
+        _create_model(
+            client,
+            model_name,
+            REQUIRED_MODELS[model_name]["from"],
+            REQUIRED_MODELS[model_name]["template"],
+        )
+    else:
+        logger.debug("model %s not found, downloading...", model_name)
+        _load_model(client, model_name)
 
 
 def extract_chapters(description):
@@ -168,7 +387,10 @@ def extract_chapters(description):
     """
     logger.debug("Prompt (extract_chapters): %s", prompt)
     chapters_text = _call_ollama_chat(
-        prompt, model="ministral-3:8b", format=ChaptersInfo.model_json_schema()
+        prompt,
+        model=_llm_model(),
+        format=ChaptersInfo.model_json_schema(),
+        call_site="extract_chapters",
     )
     logger.debug("Result (extract_chapters): %s", chapters_text)
     chapters_info = ChaptersInfo.model_validate_json(chapters_text)
@@ -180,19 +402,6 @@ def extract_chapters(description):
     return chapters
 
 
-def extract_text_from_screenshot(image_path):
-    prompt = "extract text from screenshot. do not comment text itself, provide only text, do not use markdown, use only text."
-    result = _call_ollama_chat(
-        prompt,
-        model="ministral-3:8b",
-        temperature=0.35,
-        max_tokens=256,
-        num_predict=256,
-        images=["data/" + image_path],
-    )
-    return result.strip("\n").replace("`", "").replace('"', "")
-
-
 def extract_title_and_author_from_image(image_path):
     class BookInfo(BaseModel):
         title: str
@@ -204,49 +413,15 @@ def extract_title_and_author_from_image(image_path):
     book_info_json = _call_ollama_chat(
         prompt,
         images=["data/" + image_path],
-        model="ministral-3:8b",
+        model=_llm_model(),
         temperature=0,
         format=BookInfo.model_json_schema(),
+        call_site="extract_title_and_author_from_image",
     )
     book_info = BookInfo.model_validate_json(book_info_json)
     return book_info.title, book_info.author
 
 
-def extract_terms(text, description, title):
-    class TermsInfo(BaseModel):
-        terms: list[str]
-
-    prompt = f"""Extract technical terms from text below, do not comment text itself, provide only terms, do not use punctuation.
-text: ```{text}```
-title: ```{title}```
-description: ```{description}```
-provide answer in json format"""
-    logger.debug("%s %s", len(prompt), prompt)
-    result = _call_ollama_chat(
-        prompt, model="ministral-3:8b", temperature=0, format=TermsInfo.model_json_schema()
-    )
-    terms_info = TermsInfo.model_validate_json(result)
-    return terms_info.terms
-
-
-def filter_terms(list_of_terms):
-    class TermsInfo(BaseModel):
-        terms: list[str]
-
-    list_of_terms = list(set(list_of_terms))
-    text = "\n".join(list_of_terms)
-    prompt = f"""You are given a list of technical terms and common words. 
-    filter out common words, copy to answer only technical terms, do not comment, provide only terms, do not use punctuation.
-list of terms:\n```{text}```
-provide answer in json format.
-"""
-    result = _call_ollama_chat(
-        prompt, model="ministral-3:8b", temperature=0, format=TermsInfo.model_json_schema()
-    )
-    terms_info = TermsInfo.model_validate_json(result)
-    return terms_info.terms
-
-
 def generate_title(text, title, lang="ru"):
     class TitleInfo(BaseModel):
         title: str
@@ -254,19 +429,26 @@ def generate_title(text, title, lang="ru"):
     languages = {"ru": "russian", "en": "english"}
     language = languages.get(lang, lang)
     text = text.replace("\n\n", "\n")
+    # instructions first, then the per-document part, the chapter text and the reminder last:
+    # calls for chapters of one text share the prompt prefix and reuse the server KV cache
     prompt = f"""generate one line title for text below, do not comment text itself, provide only title, do not use punctuation.
 do not use markdown, use only text.
 Use {language} language. Title should be short, simple and descriptive
 context: this is chapter of transcription of audio 
 you will be provided with title for whole text and chapter text:
-title for whole text: ```{title}``` 
+provide answer in json format
+title for whole text: ```{title}```
 chapter text: ```{text}```
-and again use {language} language and provide only title, title should as short as possible and as simple as possible
-provide answer in json format"""
+and again use {language} language and provide only title, \
+title should as short as possible and as simple as possible"""
     prompt = prompt.strip()
     logger.debug("%s %s", len(prompt), prompt)
     result = _call_ollama_chat(
-        prompt, model="ministral-3:8b", temperature=0.0, format=TitleInfo.model_json_schema()
+        prompt,
+        model=_llm_model(),
+        temperature=0.0,
+        format=TitleInfo.model_json_schema(),
+        call_site="generate_title",
     )
     logger.debug("%s %s %s", "result:\n", result, "\n")
     title_info = TitleInfo.model_validate_json(result)
@@ -283,36 +465,66 @@ provide answer in json format"""
     return cleaned_title
 
 
-def extract_speakers_names(text, title, description, channel_title):
-    prompt = f"""
-    You are an NER extractor. Output only JSON. No extra text.
-    Extract all person names from this text:
-    title: ```{title}```
-    description: ```{description}```
-    channel title: ```{channel_title}```
-    text: ```{text}```
+# screenshots are looked at in grids of 2x2, at most this many grids per request
+CONTACT_SHEET_CELLS = 4
+MAX_CONTACT_SHEETS = 4
+
+
+def extract_names_and_terms(image_paths, title, author, description):
+    """
+    Person names and technical terms for the whisper prompt, from video metadata and
+    screenshots, in one structured request over contact sheets of the screenshots.
     """
 
-    format_dict = {
-        "type": "object",
-        "properties": {"names": {"type": "array", "items": {"type": "string"}}},
-        "required": ["names"],
-    }
+    class NamesAndTerms(BaseModel):
+        names: list[str]
+        terms: list[str]
+
+    model = _llm_model()
+    max_images = CONTACT_SHEET_CELLS * MAX_CONTACT_SHEETS
+    if len(image_paths) > max_images:
+        step = len(image_paths) / max_images
+        image_paths = [image_paths[int(i * step)] for i in range(max_images)]
+    # sheet is not larger than the model input, so screenshots are not downscaled twice
+    cell_side = VISION_MODEL_IMAGE_SIDES.get(model, DEFAULT_IMAGE_SIDE) // 2
+    sheets = pillow_wrapper.create_contact_sheets(image_paths, cell_side, CONTACT_SHEET_CELLS)
+
+    prompt = f"""You are an NER and terminology extractor. Output only JSON. No extra text.
+You will be given video metadata and screenshots of the video, several screenshots per image.
+names: all person names mentioned in metadata or visible on screenshots.
+terms: technical terms, product names and rare words from metadata and screenshots,
+skip common words, do not use punctuation.
+title: ```{title}```
+channel/author: ```{author}```
+description: ```{description}```"""
+    result = _call_ollama_chat(
+        prompt,
+        model=model,
+        temperature=0,
+        images=sheets,
+        format=NamesAndTerms.model_json_schema(),
+        call_site="extract_names_and_terms",
+    )
+    names_and_terms = NamesAndTerms.model_validate_json(result)
+    logger.debug("extract_names_and_terms: %s", names_and_terms)
+    return names_and_terms.names, names_and_terms.terms
 
-    result = _call_ollama_chat(prompt, model="ministral-3:8b", format=format_dict)
-    result_dict = json.loads(result)
-    speakers = result_dict["names"]
-    logger.debug(f"extract_speakers_names speakers: {speakers}")
-    return speakers
+
+def _html_evidence(html_content, question, model):
+    token_budget = html_evidence_helper.get_token_budget(model)
+    return html_evidence_helper.extract_evidence(html_content, question, token_budget)
 
 
 def extract_downloadable_links(html_content, links_block):
+    model = _llm_model()
+    evidence = _html_evidence(html_content, "audio_links", model)
     prompt = f"""
     You are an http link extractor. Output only JSON. No extra text.
     extract link to audio file for podcast episode
-    you will be given html content of podcast episode and list of links in triple backquotes
-    html content: 
-    ```{html_content}```
+    you will be given facts extracted from html page of podcast episode \
+and list of links in triple backquotes
+    page facts: 
+    ```{evidence}```
     links: 
     ```{links_block}```
     your answer should provide link itself and nothing else
@@ -323,7 +535,13 @@ def extract_downloadable_links(html_content, links_block):
         "properties": {"links": {"type": "array", "items": {"type": "string"}}},
         "required": ["links"],
     }
-    result = _call_ollama_chat(prompt, model="ministral-3:8b", temperature=0, format=format_dict)
+    result = _call_ollama_chat(
+        prompt,
+        model=model,
+        temperature=0,
+        format=format_dict,
+        call_site="extract_downloadable_links",
+    )
     result_dict = json.loads(result)
     links = result_dict["links"]
     return links
@@ -333,22 +551,25 @@ def extract_description(html_content):
     class PodcastEpisodeInfo(BaseModel):
         description: str
 
+    model = _llm_model()
+    evidence = _html_evidence(html_content, "description", model)
     prompt = f"""
     extract description of podcast episode
-    you will be given html content of podcast episode page
+    you will be given facts extracted from html page of podcast episode
     provide episode description
     do not provide anything else, only description
     do not use markdown, use only text.
     do not comment anything.
-    html content: ```{html_content}```
+    page facts: ```{evidence}```
     provide answer in json format
     """
     logger.debug(f"Prompt (extract_description): {prompt}")
     result = _call_ollama_chat(
         prompt,
-        model="ministral-3:8b",
+        model=model,
         temperature=0.0,
         format=PodcastEpisodeInfo.model_json_schema(),
+        call_site="extract_description",
     )
     logger.debug(f"Result (extract_description): {result}")
     podcast_info = PodcastEpisodeInfo.model_validate_json(result)
@@ -360,15 +581,21 @@ def extract_episode_title_and_podcast_name(html_content):
         title: str
         podcast_name: str
 
+    model = _llm_model()
+    evidence = _html_evidence(html_content, "title", model)
     prompt = f"""
     extract episode title and podcast name from html page about podcast episode
-    you will be given html content of podcast episode page in triple backquotes
+    you will be given facts extracted from podcast episode page in triple backquotes
     do not use markdown, use only text.
     do not provide anything else, only title and podcast name
-    html content: ```{html_content}```
+    page facts: ```{evidence}```
     """
     result = _call_ollama_chat(
-        prompt, model="ministral-3:8b", temperature=0.0, format=EpisodeInfo.model_json_schema()
+        prompt,
+        model=model,
+        temperature=0.0,
+        format=EpisodeInfo.model_json_schema(),
+        call_site="extract_episode_title_and_podcast_name",
     )
     episode_info = EpisodeInfo.model_validate_json(result)
     return episode_info.title, episode_info.podcast_name
@@ -378,15 +605,21 @@ def extract_rss_links(html_content):
     class PodcastInfo(BaseModel):
         rss_link: str
 
+    model = _llm_model()
+    evidence = _html_evidence(html_content, "rss_links", model)
     prompt = f"""
         extract link to rss feed for podcast
 
         provide link as is, do not change it
-        html content: 
-        ```{html_content}```
+        page facts: 
+        ```{evidence}```
         """
     result = _call_ollama_chat(
-        prompt, model="ministral-3:8b", temperature=0, format=PodcastInfo.model_json_schema()
+        prompt,
+        model=model,
+        temperature=0,
+        format=PodcastInfo.model_json_schema(),
+        call_site="extract_rss_links",
     )
     podcast_info = PodcastInfo.model_validate_json(result)
     return podcast_info.rss_link
@@ -402,7 +635,11 @@ def extract_podcast_name(episode_podcast_name):
             provide podcast name only in json format
             """
     result = _call_ollama_chat(
-        prompt, model="ministral-3:8b", temperature=0, format=PodcastName.model_json_schema()
+        prompt,
+        model=_llm_model(),
+        temperature=0,
+        format=PodcastName.model_json_schema(),
+        call_site="extract_podcast_name",
     )
     podcast_name = PodcastName.model_validate_json(result)["podcast_name"]
     return podcast_name
@@ -416,22 +653,26 @@ def get_speakers_names(text, title, author, description, model=None):
     class SpeakersInfo(BaseModel):
         speakers: list[SpeakerInfo]
 
-    prompt = f"""
-detect name for each speaker in text.
+    # fixed instructions, then video metadata shared by all speakers, then the speaker excerpt
+    prompt = f"""detect name for each speaker in text.
 you will be given video title, channel/author, description and text with speaker id, like SPEAKER_02. 
 your task is to provide name for each speaker id.
+include in answer only speakers with identified names
+provide answer in json format
 title: ```{title}```
 channel/author: ```{author}```
 description: ```{description}```
-text: ```{text}```
-include in answer only speakers with identified names
-provide answer in json format"""
-    prompt = prompt.strip("")
+text: ```{text}```"""
     if not model:
-        model = "ministral-3:8b"
+        model = _llm_model()
     logger.debug("prompt: %s", prompt)
     result = _call_ollama_chat(
-        prompt, model=model, temperature=0.0, think=False, format=SpeakersInfo.model_json_schema()
+        prompt,
+        model=model,
+        temperature=0.0,
+        think=False,
+        format=SpeakersInfo.model_json_schema(),
+        call_site="get_speakers_names",
     )
     logger.debug("result: %s", result)
     speakers_info = SpeakersInfo.model_validate_json(result)
@@ -461,32 +702,25 @@ def choose_best_option(text, error_message, options: dict[str, str]):
         "additionalProperties": False,
     }
 
-    base_prompt = """
+    # instructions do not depend on arguments, the paragraph (shared by all its matches)
+    # comes before the error message and options, so consecutive calls share a prefix
+    prompt = """
 Act as a professional corrector.
-You will be given a list of options{ctx_note}. Your task is to choose the best option.
-
-Options:
-```
-{options_block}
-```
-{extra}
-
+You will be given a list of options, possibly with context and an error message.
+Your task is to choose the best option.
 Return your answer strictly as JSON that matches the provided schema.
-""".strip()
-
-    ctx_note = " with an error message and context" if text and error_message else ""
-    extra_parts = []
-    if error_message:
-        extra_parts.append(f"Error message:\n```\n{error_message}\n```")
+""".lstrip()
     if text:
-        extra_parts.append(f"Context:\n```\n{text}\n```")
-    extra = "\n".join(extra_parts)
-
-    prompt = base_prompt.format(ctx_note=ctx_note, options_block=options_block, extra=extra)
+        prompt += f"Context:\n```\n{text}\n```\n"
+    if error_message:
+        prompt += f"Error message:\n```\n{error_message}\n```\n"
+    prompt += f"Options:\n```\n{options_block}\n```"
 
     logger.debug("prompt: %s", prompt)
-    model = "ministral-3:8b"
-    result = _call_ollama_chat(prompt, model=model, temperature=0.0, format=json_schema)
+    model = _llm_model()
+    result = _call_ollama_chat(
+        prompt, model=model, temperature=0.0, format=json_schema, call_site="choose_best_option"
+    )
     chosen_key = None
     try:
         data = json.loads(result)
@@ -500,6 +734,67 @@ Return your answer strictly as JSON that matches the provided schema.
     return chosen_key
 
 
+def choose_best_options(text, errors: list[tuple[str, dict[str, str]]]):
+    """
+    Batch variant of choose_best_option: one request for all errors of one paragraph.
+
+    Args:
+        text (str): the paragraph, shared context of all errors
+        errors (list): (error_message, options) pairs, options map key -> option text
+
+    Returns:
+        list: chosen option key for each error, None where the model returned nothing valid
+    """
+    if not errors:
+        return []
+    # every error gets its own property restricted to its own option keys
+    json_schema = {
+        "type": "object",
+        "properties": {
+            f"error_{i + 1}": {"type": "string", "enum": list(options.keys())}
+            for i, (_, options) in enumerate(errors)
+        },
+        "required": [f"error_{i + 1}" for i in range(len(errors))],
+        "additionalProperties": False,
+    }
+    errors_block = "\n\n".join(
+        f"error_{i + 1}: {error_message}\n"
+        + "\n".join(f"{key}: {value}" for key, value in options.items())
+        for i, (error_message, options) in enumerate(errors)
+    )
+    prompt = f"""Act as a professional corrector.
+You will be given a context and a list of errors found in it, each error with a list of options.
+Option a always keeps the original text. For each error choose the best option.
+Return your answer strictly as JSON that matches the provided schema.
+Context:
+```
+{text}
+```
+Errors:
+```
+{errors_block}
+```"""
+    logger.debug("prompt: %s", prompt)
+    result = _call_ollama_chat(
+        prompt,
+        model=_llm_model(),
+        temperature=0.0,
+        num_predict=32 * len(errors) + 64,
+        format=json_schema,
+        call_site="choose_best_options",
+    )
+    try:
+        data = json.loads(result)
+    except Exception:
+        data = {}
+    choices = []
+    for i, (_, options) in enumerate(errors):
+        key = data.get(f"error_{i + 1}")
+        choices.append(key if isinstance(key, str) and key in options else None)
+    logger.debug("options: %s", choices)
+    return choices
+
+
 def translate(text, language="ru", language_to="english", context=None):
     # prompts from model page https://huggingface.co/tencent/HY-MT1.5-7B-GGUF
     languages = {
@@ -544,7 +839,12 @@ def translate(text, language="ru", language_to="english", context=None):
 }
 
 
-    model = "hy-mt1.5-7b:q4"
+    model = hardware_profile_helper.get_profile().translate_model
+    use_memory = config.get_config().translation_memory
+    if use_memory:
+        cached = translation_memory_helper.lookup(text, language, language_to, model)
+        if cached is not None:
+            return cached
     if language == "zh":
         prompt = f"""把下面的文本翻译成{languages.get(language_to, 'en')}，不要额外解释。
 
@@ -557,29 +857,71 @@ Translate the following segment into {language_to}, without additional explanati
 """
         prompt = prompt.strip()
     else:
+        # contextual template of the model page, context first as the model was trained on it
         prompt = f"""
 {context}
 参考上面的信息，把下面的文本翻译成{languages.get(language_to, 'en')}，注意不需要翻译上文，也不要额外解释：
 {text}
 """
         prompt = prompt.strip()
-    result = _call_ollama_chat(prompt, model=model)
+    result = _call_ollama_chat(prompt, model=model, call_site="translate")
     logger.debug("text: %s", text)
     logger.debug("result: %s", result)
+    if use_memory:
+        translation_memory_helper.store(text, language, language_to, model, result)
     return result
 
 
+def translate_many(texts, language="ru", language_to="english", contexts=None, desc=None):
+    """
+    Translate segments of one document concurrently.
+    Identical segments are translated once (with the context of the first occurrence),
+    segments seen in earlier documents come from the translation memory.
+    """
+    texts = list(texts)
+    contexts = list(contexts) if contexts is not None else [None] * len(texts)
+    first_index = {}
+    for i, text in enumerate(texts):
+        first_index.setdefault(translation_memory_helper.normalize(text), i)
+    unique_indexes = list(first_index.values())
+    translation_memory_helper.count_duplicates(len(texts) - len(unique_indexes))
+    translations = parallel_map(
+        lambda i: translate(texts[i], language, language_to=language_to, context=contexts[i]),
+        unique_indexes,
+        desc=desc,
+    )
+    by_text = dict(zip(first_index.keys(), translations, strict=True))
+    return [by_text[translation_memory_helper.normalize(text)] for text in texts]
+
+
+def _ocr_with_early_abort(prompt, image_path, call_site, keep_loop=False):
+    """
+    deepseek-ocr sometimes repeats the same sequence until it reaches the context window limit.
+    Stream the answer and stop as soon as a loop shows up. With keep_loop the partial text is
+    returned as is, so the looping block is recognised and re-OCRed from its own crop
+    (pdf.recover_broken_blocks), otherwise the repeated tail is trimmed.
+    """
+    try:
+        return _call_ollama_chat(
+            prompt,
+            model="deepseek-ocr:latest",
+            temperature=0.0,
+            images=[image_path],
+            abort_check=text_helper.is_degenerate,
+            call_site=call_site,
+        )
+    except DegenerateOutputError as e:
+        logger.debug("deepseek-ocr loop detected for %s", image_path)
+        if keep_loop:
+            return e.partial_text
+        return text_helper.trim_repetition(e.partial_text)
+
+
 def ocr_with_deepseek_grounding(image_path):
     prompt = "<image>\n<|grounding|>Convert the document to markdown."
-    result = _call_ollama_chat(
-        prompt, model="deepseek-ocr:latest", temperature=0.0, images=[image_path]
-    )
-    return result
+    return _ocr_with_early_abort(prompt, image_path, "ocr_with_deepseek_grounding", keep_loop=True)
 
 
 def ocr_with_deepseek(image_path):
     prompt = "<image>\nConvert the document to markdown."
-    result = _call_ollama_chat(
-        prompt, model="deepseek-ocr:latest", temperature=0.0, images=[image_path]
-    )
-    return result
+    return _ocr_with_early_abort(prompt, image_path, "ocr_with_deepseek")
@@ -1,8 +1,13 @@
+import hashlib
+import io
+import math
 import os
 
 from PIL import Image, ImageDraw, ImageFont
 
-from src.helpers.filepath_helper import generate_random_filename
+from src.helpers.filepath_helper import generate_random_filename, get_abs_path, temp_path_for
+
+PREPARED_IMAGES_DIR = "prepared_images"
 
 
 def crop_by_bbox(image_filepath: str, bbox: list[int], index) -> str:
@@ -117,3 +122,73 @@ def create_cover(base_image_path, title, author, cwd=None):
 
     cover.save(output_path)
     return returned_path
+
+
+def _to_rgb(image):
+    """Transparent areas become white (page background), not black as with a plain convert."""
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[3])
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def prepare_image_for_model(image_path: str, max_side: int, quality: int = 90) -> bytes:
+    """
+    Downscale an image so its longest side is at most `max_side` (model input resolution)
+    and re-encode it as JPEG. Prepared bytes are cached in data/prepared_images by content hash,
+    so the same page or screenshot is only resized once.
+    """
+    with open(image_path, "rb") as f:
+        original = f.read()
+    digest = hashlib.sha256(original).hexdigest()
+    cache_dir = get_abs_path(PREPARED_IMAGES_DIR)
+    cache_path = os.path.join(cache_dir, f"{digest}_{max_side}_{quality}.jpg")
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            return f.read()
+
+    image = _to_rgb(Image.open(io.BytesIO(original)))
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    prepared = buffer.getvalue()
+    if len(prepared) >= len(original) and image_path.lower().endswith((".jpg", ".jpeg")):
+        prepared = original  # already small enough, keep the original encoding
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # written aside and renamed, a concurrent reader never sees a half-written file
+    tmp_path = temp_path_for(cache_path)
+    with open(tmp_path, "wb") as f:
+        f.write(prepared)
+    os.replace(tmp_path, cache_path)
+    return prepared
+
+
+def create_contact_sheets(image_paths: list[str], cell_side: int, per_sheet: int = 4) -> list[str]:
+    """
+    Paste images into grids of `per_sheet` cells (each image fits into cell_side x cell_side),
+    so a vision model can look at several screenshots in one request.
+    Returns absolute paths of the sheets written to the data directory.
+    """
+    columns = max(1, math.ceil(math.sqrt(per_sheet)))
+    sheets = []
+    for start in range(0, len(image_paths), per_sheet):
+        images = []
+        for path in image_paths[start : start + per_sheet]:
+            image = _to_rgb(Image.open(path))
+            image.thumbnail((cell_side, cell_side), Image.Resampling.LANCZOS)
+            images.append(image)
+        cell_w = max(image.width for image in images)
+        cell_h = max(image.height for image in images)
+        rows = math.ceil(len(images) / columns)
+        sheet = Image.new("RGB", (cell_w * min(columns, len(images)), cell_h * rows), (0, 0, 0))
+        for i, image in enumerate(images):
+            sheet.paste(image, ((i % columns) * cell_w, (i // columns) * cell_h))
+        sheet_path = get_abs_path(generate_random_filename("contact_sheet", "jpg"))
+        sheet.save(sheet_path, quality=90)
+        sheets.append(sheet_path)
+    return sheets
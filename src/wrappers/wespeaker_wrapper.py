@@ -1,19 +1,37 @@
 import logging
 import os
 
+from src.config import get_config
+from src.helpers import transcript_cache_helper
 from src.helpers.filepath_helper import generate_random_filename, get_abs_path, get_rel_path
 from src.wrappers import docker_wrapper
 
 logger = logging.getLogger(__name__)
 
+# pretrained wespeaker model per language, the container loads the one it is given
+MODELS = {"en": "english"}
+DEFAULT_MODEL = "vblinkf"
+
+
+def model_for(language) -> str:
+    return MODELS.get(language, DEFAULT_MODEL)
+
 
 def diarize(audio_path, language="en"):
     audio_path = get_rel_path(audio_path)
     json_path = generate_random_filename("diarize", "json")
-    command = ["--", audio_path, json_path, language]
+    model = model_for(language)
+    use_cache = get_config().transcript_cache
+    if use_cache:
+        key = transcript_cache_helper.cache_key(audio_path, "diarization", model=model)
+        if transcript_cache_helper.lookup(key, "diarization", json_path):
+            return json_path
+    command = ["--", audio_path, json_path, language, "--model", model]
     result = docker_wrapper.run_docker_container("wespeaker", command)
     if not os.path.isfile(get_abs_path(json_path)):
         logger.error("wespeaker failed to generate json file: %s", result.stderr)
         logger.debug("wespeaker stdout:\n%s", result.stdout)
         return None
+    if use_cache:
+        transcript_cache_helper.store(key, json_path)
     return json_path
@@ -1,35 +1,53 @@
+import json
 import logging
 import os
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import requests
+
+from src import pipeline
+from src.config import get_config
+from src.helpers import (
+    audio_chunk_helper,
+    hardware_profile_helper,
+    transcript_cache_helper,
+    whisper_autotune_helper,
+)
+from src.helpers.filepath_helper import get_abs_path
 from src.wrappers import docker_wrapper
 
 logger = logging.getLogger(__name__)
 
-def audio_to_json(input_name, language="ru", prompt=None):
+MIN_CHUNK_SECONDS = 300  # shorter chunks cost more in model loading than they save
+STREAM_CHUNK_SECONDS = 600  # chunk length when segments are consumed while transcribing
+SERVICE_START_TIMEOUT = 120
+SERVICE_MIN_TIMEOUT = 600  # a job may have to load the model first
+SERVICE_TIMEOUT_PER_AUDIO_SECOND = 4  # slower than that the service is considered stuck
+
+# WhisperService of the running transcription stage, None outside of it
+_active_service = None
+
+
+def _run_whisperx_cli(input_name, language, prompt, threads, align=True, profile=None):
     pwd = subprocess.run(["pwd"], capture_output=True, text=True, check=True).stdout.strip()
     data_root = os.path.join(pwd, "data")
     if os.path.isabs(input_name):
         raise ValueError("input_name must be relative under data/")
     full_path_host = os.path.join(data_root, os.path.normpath(input_name))
     container_input_path = "/data/" + os.path.basename(full_path_host)
-    if not docker_wrapper._is_gpu_available():
-        compute_type = "int8"
-        whisper_model = "small"
-        beam_size = "4"
-    else:
-        compute_type = "float16"
-        whisper_model = "large-v2"
-        beam_size = "10"
+    profile = profile or hardware_profile_helper.get_profile()
     command = [
         "--output_format",
         "json",
         "--model",
-        whisper_model,
+        profile.whisper_model,
         "--vad_method",
         "silero",
         "--beam_size",
-        beam_size,
+        str(profile.whisper_beam_size),
         "--temperature",
         "0",
         "--language",
@@ -37,11 +55,16 @@ def audio_to_json(input_name, language="ru", prompt=None):
         "--output_dir",
         "/data",
         "--compute_type",
-        compute_type,
-        "--threads", "16"
+        profile.whisper_compute_type,
+        "--threads",
+        str(threads),
+        "--batch_size",
+        str(profile.whisper_batch_size),
     ]
     if prompt:
         command += ["--initial_prompt", prompt]
+    if not align:
+        command += ["--no_align"]
     command += [container_input_path]
     result = docker_wrapper.run_docker_container("whisperx", command)
     if result.returncode != 0:
@@ -50,3 +73,342 @@ def audio_to_json(input_name, language="ru", prompt=None):
         raise RuntimeError("WhisperX processing failed")
     output_json = os.path.splitext(input_name)[0] + ".json"
     return output_json
+
+
+def _wait_until_ready(base_url):
+    deadline = time.time() + SERVICE_START_TIMEOUT
+    while True:
+        try:
+            requests.get(f"{base_url}/ping", timeout=5).raise_for_status()
+            return
+        except requests.RequestException:
+            if time.time() > deadline:
+                raise
+            time.sleep(1)
+
+
+class WhisperService:
+    """
+    whisperx_service container for the duration of the transcription stage, so the whisper
+    model stays loaded between chunks and calibration runs and is gone from memory before
+    the stages that need the LLM. It is started by the first job sent to it, a stage served
+    from the transcript cache or by parallel cli workers never starts it. A container that
+    does not start is not retried, everything within the stage runs the whisperx cli instead.
+    """
+
+    def __init__(self):
+        self.service = None
+        self.failed = False
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        global _active_service
+        if get_config().whisper_service:
+            _active_service = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _active_service
+        if _active_service is self:
+            _active_service = None
+        self._remove()
+
+    def base_url(self) -> str | None:
+        """Base url of the container, started on the first call, None when it did not start."""
+        with self._lock:
+            if self.service is None and not self.failed:
+                try:
+                    self.service = docker_wrapper.ManagedDockerService("whisperx_service")
+                    _wait_until_ready(self.service.base_url)
+                except Exception as e:
+                    logger.warning("whisper service did not start, running the whisperx cli: %s", e)
+                    self._remove()
+                    self.failed = True
+            return self.service.base_url if self.service else None
+
+    def _remove(self):
+        if self.service:
+            self.service.__exit__(None, None, None)
+            self.service = None
+
+
+def _service_available():
+    return _active_service is not None and not _active_service.failed
+
+
+def _service_timeout(input_name):
+    """(connect, read) timeout of a service job, the read timeout grows with the audio."""
+    duration = SERVICE_MIN_TIMEOUT
+    if input_name.endswith(".wav"):
+        duration = audio_chunk_helper.wav_duration(input_name)
+    return 10, SERVICE_MIN_TIMEOUT + SERVICE_TIMEOUT_PER_AUDIO_SECOND * duration
+
+
+def _run_whisperx_service(input_name, language, prompt, threads, align=True, profile=None):
+    """Returns the transcript json path and the load/transcribe/align timings of the job."""
+    if os.path.isabs(input_name):
+        raise ValueError("input_name must be relative under data/")
+    profile = profile or hardware_profile_helper.get_profile()
+    base_url = _active_service.base_url() if _active_service else None
+    if base_url is None:
+        raise RuntimeError("whisper service is not running")
+    output_json = os.path.splitext(input_name)[0] + ".json"
+    response = requests.post(
+        f"{base_url}/transcribe",
+        json={
+            "audio": "/data/" + os.path.basename(input_name),
+            "output": "/data/" + os.path.basename(output_json),
+            "model": profile.whisper_model,
+            "compute_type": profile.whisper_compute_type,
+            "language": language,
+            "beam_size": profile.whisper_beam_size,
+            "threads": threads,
+            "batch_size": profile.whisper_batch_size,
+            "initial_prompt": prompt or None,
+            "align": align,
+        },
+        timeout=_service_timeout(input_name),
+    )
+    response.raise_for_status()
+    timings = response.json()
+    logger.info(
+        "whisper service: load %ss, transcribe %ss, align %ss",
+        timings["load_seconds"],
+        timings["transcribe_seconds"],
+        timings["align_seconds"],
+    )
+    pipeline.append_trace(
+        "whisper_jobs",
+        {
+            "input": input_name,
+            "align": align,
+            **{k: v for k, v in timings.items() if k != "output"},
+        },
+    )
+    return output_json, timings
+
+
+def _run_whisperx(input_name, language, prompt, threads, use_service=False, align=True):
+    if use_service:
+        try:
+            return _run_whisperx_service(input_name, language, prompt, threads, align)[0]
+        except Exception as e:
+            logger.warning("whisper service failed, running the whisperx cli: %s", e)
+    return _run_whisperx_cli(input_name, language, prompt, threads, align)
+
+
+def _transcript_text(json_path):
+    with open(get_abs_path(json_path), encoding="utf-8") as f:
+        return " ".join(segment["text"] for segment in json.load(f).get("segments") or [])
+
+
+def calibrate(input_name, language):
+    """
+    Tune whisper settings on a clip from the middle of `input_name` (a 16 kHz wav)
+    unless this machine already has calibrated settings for the current whisper model.
+    """
+    key = hardware_profile_helper.whisper_tuning_key()
+    if whisper_autotune_helper.load_tuning(key):
+        return
+    cfg = get_config()
+    duration = audio_chunk_helper.wav_duration(input_name)
+    clip_seconds = min(whisper_autotune_helper.CALIBRATION_SECONDS, duration)
+    clip = audio_chunk_helper.extract_clip(input_name, (duration - clip_seconds) / 2, clip_seconds)
+    # real-time factors of the service exclude model loading, the cli ones do not: when the
+    # service fails all settings are measured again with the cli, never a mix of both
+    service_errors = []
+
+    def run_on_service(profile):
+        if service_errors:
+            raise RuntimeError("whisper service failed") from service_errors[0]
+        try:
+            output_json, timings = _run_whisperx_service(
+                clip, language, None, profile.whisper_threads, align=False, profile=profile
+            )
+        except Exception as e:
+            service_errors.append(e)
+            raise
+        return _transcript_text(output_json), timings["transcribe_seconds"] / clip_seconds
+
+    def run_on_cli(profile):
+        start = time.time()
+        output_json = _run_whisperx_cli(
+            clip, language, None, profile.whisper_threads, align=False, profile=profile
+        )
+        return _transcript_text(output_json), (time.time() - start) / clip_seconds
+
+    fixed = [name for name in ["whisper_compute_type"] if getattr(cfg, name)]
+    if cfg.whisper_workers:
+        fixed.append("whisper_threads")
+
+    def tune(run):
+        return whisper_autotune_helper.tune(
+            hardware_profile_helper.get_profile(),
+            hardware_profile_helper.get_hardware().gpu,
+            run,
+            cfg.whisper_target_rtf,
+            cfg.whisper_max_wer_increase,
+            fixed,
+        )
+
+    logger.info("calibrating whisper settings on %ss of %s", round(clip_seconds), input_name)
+    try:
+        measured_on_service = _service_available()
+        if measured_on_service:
+            try:
+                settings, results = tune(run_on_service)
+            except Exception:
+                if not service_errors:
+                    raise
+        if not measured_on_service or service_errors:
+            if service_errors:
+                logger.warning(
+                    "whisper service failed, calibrating with the whisperx cli: %s",
+                    service_errors[0],
+                )
+            settings, results = tune(run_on_cli)
+    finally:
+        os.remove(get_abs_path(clip))
+    whisper_autotune_helper.save_tuning(key, {"settings": settings, "results": results})
+    hardware_profile_helper.set_whisper_tuning(settings)
+    pipeline.record_trace("whisper_calibration", {"settings": settings, "results": results})
+
+
+def _shift_timestamps(items, offset):
+    for item in items:
+        for key in ["start", "end"]:
+            if isinstance(item.get(key), (int, float)):
+                item[key] = round(item[key] + offset, 3)
+        _shift_timestamps(item.get("words") or [], offset)
+
+
+def _load_transcript(json_path, offset=0.0):
+    with open(get_abs_path(json_path), encoding="utf-8") as f:
+        transcript = json.load(f)
+    for key in ["segments", "word_segments"]:
+        _shift_timestamps(transcript.get(key) or [], offset)
+    return transcript
+
+
+def merge_transcripts(transcripts, output_json):
+    """Concatenate chunk transcripts (timestamps already shifted) into output_json."""
+    merged = {"segments": [], "word_segments": []}
+    for transcript in transcripts:
+        for key in ["segments", "word_segments"]:
+            merged[key] += transcript.get(key) or []
+        merged.setdefault("language", transcript.get("language"))
+    with open(get_abs_path(output_json), "w", encoding="utf-8") as f:
+        json.dump(merged, f, ensure_ascii=False)
+    return output_json
+
+
+def _audio_to_json_chunked(
+    input_name, language, prompt, chunks, workers, threads, on_segments, align
+):
+    chunks = audio_chunk_helper.split_at_silence(input_name, chunks)
+    logger.info(
+        "transcribing %s chunks, %s at a time with %s threads each", len(chunks), workers, threads
+    )
+    base = os.path.splitext(input_name)[0]
+    transcripts = []
+    # finished segments are appended chunk by chunk, readable while later chunks are running
+    with ThreadPoolExecutor(max_workers=workers) as executor, open(
+        get_abs_path(base + ".segments.jsonl"), "w", encoding="utf-8"
+    ) as jsonl:
+        # a single worker runs the chunks one after another on the warm service
+        use_service = workers == 1 and _service_available()
+        run_whisperx = pipeline.bind_context(_run_whisperx)
+        futures = [
+            executor.submit(run_whisperx, chunk_path, language, prompt, threads, use_service, align)
+            for chunk_path, _ in chunks
+        ]
+        for future, (chunk_path, offset) in zip(futures, chunks, strict=True):
+            transcript = _load_transcript(future.result(), offset)
+            os.remove(get_abs_path(chunk_path))
+            transcripts.append(transcript)
+            for segment in transcript.get("segments") or []:
+                jsonl.write(json.dumps(segment, ensure_ascii=False) + "\n")
+            jsonl.flush()
+            if on_segments:
+                on_segments(transcript.get("segments") or [])
+    return merge_transcripts(transcripts, base + ".json")
+
+
+def _chunk_count(input_name, profile, on_segments):
+    if not input_name.endswith(".wav"):
+        return 1
+    duration = audio_chunk_helper.wav_duration(input_name)
+    chunks = min(profile.whisper_workers, int(duration // MIN_CHUNK_SECONDS))
+    if on_segments:
+        chunks = max(chunks, int(duration // STREAM_CHUNK_SECONDS))
+    return max(chunks, 1)
+
+
+def _transcribe(input_name, language, prompt, on_segments, align):
+    """
+    With profile.whisper_workers > 1 (cpu hosts) long audio is split at silences
+    and the chunks are transcribed by parallel containers.
+    on_segments is called with the segments of every finished chunk, in order,
+    while the following chunks are still being transcribed; with it long audio is
+    cut into STREAM_CHUNK_SECONDS chunks even when only one worker is available.
+    align=False skips the forced alignment: segments keep whisper timestamps, no word timings.
+    """
+    profile = hardware_profile_helper.get_profile()
+    workers = profile.whisper_workers
+    chunks = _chunk_count(input_name, profile, on_segments)
+    if chunks > 1:
+        return _audio_to_json_chunked(
+            input_name,
+            language,
+            prompt,
+            chunks,
+            min(workers, chunks),
+            profile.whisper_threads,
+            on_segments,
+            align,
+        )
+    output_json = _run_whisperx(
+        input_name,
+        language,
+        prompt,
+        profile.whisper_threads,
+        _service_available(),
+        align,
+    )
+    if on_segments:
+        on_segments(_load_transcript(output_json).get("segments") or [])
+    return output_json
+
+
+def audio_to_json(input_name, language="ru", prompt=None, on_segments=None, align=True):
+    """
+    Transcribe a 16 kHz mono wav (relative to data/) into whisperx json, see _transcribe.
+    Transcripts are cached by the decoded audio, language, prompt, alignment and every
+    decoding setting that changes the text: model, compute type, beam and batch size, chunks.
+    """
+    # calibration changes the decoding settings, it runs before they go into the cache key
+    if get_config().whisper_autotune and input_name.endswith(".wav"):
+        calibrate(input_name, language)
+    if not get_config().transcript_cache:
+        return _transcribe(input_name, language, prompt, on_segments, align)
+    profile = hardware_profile_helper.get_profile()
+    key = transcript_cache_helper.cache_key(
+        input_name,
+        "transcript",
+        model=profile.whisper_model,
+        compute_type=profile.whisper_compute_type,
+        beam_size=profile.whisper_beam_size,
+        batch_size=profile.whisper_batch_size,
+        chunks=_chunk_count(input_name, profile, on_segments),
+        language=language,
+        prompt=prompt or "",
+        align=align,
+    )
+    output_json = os.path.splitext(input_name)[0] + ".json"
+    if transcript_cache_helper.lookup(key, "transcript", output_json):
+        if on_segments:
+            on_segments(_load_transcript(output_json).get("segments") or [])
+        return output_json
+    output_json = _transcribe(input_name, language, prompt, on_segments, align)
+    transcript_cache_helper.store(key, output_json)
+    return output_json
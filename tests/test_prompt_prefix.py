@@ -0,0 +1,83 @@
+"""
+Consecutive LLM calls of one job should differ only at the end of the prompt, so the server
+can reuse the KV cache of the shared prefix instead of prefilling the whole prompt again.
+"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from src.wrappers import ollama_wrapper
+
+RESPONSES = {
+    "generate_title": '{"title": "title"}',
+    "get_speakers_names": '{"speakers": []}',
+    "choose_best_option": '{"option": "a"}',
+    "choose_best_options": "{}",
+    "translate": "translation",
+}
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    sent = []
+
+    def fake_chat(prompt, call_site=None, **kwargs):
+        sent.append(prompt)
+        return RESPONSES[call_site]
+
+    monkeypatch.setattr(ollama_wrapper, "_call_ollama_chat", fake_chat)
+    monkeypatch.setattr(ollama_wrapper, "_llm_model", lambda: "test-model")
+    return sent
+
+
+def assert_prefix_shared_up_to(prompts, items):
+    """Prompts are identical at least up to where their per-call item starts."""
+    prefix = os.path.commonprefix(prompts)
+    for prompt, item in zip(prompts, items, strict=True):
+        assert prompt.index(item) <= len(prefix), prompt
+
+
+def test_generate_title_chapters_share_prefix(prompts):
+    chapters = ["first chapter about cats", "second chapter about dogs"]
+    for chapter in chapters:
+        ollama_wrapper.generate_title(chapter, "Pets", "en")
+    assert_prefix_shared_up_to(prompts, chapters)
+    assert "Pets" in os.path.commonprefix(prompts)
+    # the language reminder stays after the chapter text
+    assert prompts[0].endswith("as short as possible and as simple as possible")
+    assert prompts[0].count("english") == 2
+
+
+def test_get_speakers_names_excerpts_share_prefix(prompts):
+    excerpts = ["SPEAKER_00: hello, I am Anna", "SPEAKER_01: thanks, Bob here"]
+    for excerpt in excerpts:
+        ollama_wrapper.get_speakers_names(excerpt, "Interview", "Channel", "About pets")
+    assert_prefix_shared_up_to(prompts, excerpts)
+
+
+def test_choose_best_option_matches_of_a_paragraph_share_prefix(prompts):
+    paragraph = "Their is a cat on teh mat."
+    errors = ["Possible spelling mistake: Their", "Unknown word: teh"]
+    ollama_wrapper.choose_best_option(paragraph, errors[0], {"a": "Their", "b": "There"})
+    ollama_wrapper.choose_best_option(paragraph, errors[1], {"a": "teh", "b": "the"})
+    assert_prefix_shared_up_to(prompts, errors)
+    assert paragraph in os.path.commonprefix(prompts)
+
+
+def test_translate_uses_contextual_template_of_the_model(prompts, monkeypatch):
+    monkeypatch.setattr(
+        ollama_wrapper.hardware_profile_helper,
+        "get_profile",
+        lambda: SimpleNamespace(translate_model="hy-mt1.5-7b:q8"),
+    )
+    monkeypatch.setattr(
+        ollama_wrapper.config, "get_config", lambda: SimpleNamespace(translation_memory=False)
+    )
+    ollama_wrapper.translate("Привет", "ru", "en", context="Предыдущий абзац.")
+    assert prompts == [
+        "Предыдущий абзац.\n"
+        "参考上面的信息，把下面的文本翻译成英语，注意不需要翻译上文，也不要额外解释：\n"
+        "Привет"
+    ]